@@ -0,0 +1,99 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import bisect
+import threading
+
+#
+# Lightweight per-account instrumentation of Ecobee API calls.  Latencies go into fixed, log spaced histogram buckets,
+# so memory use is constant no matter how many calls are recorded, and percentiles are accurate to one bucket (25%).
+#
+
+BUCKET_BOUNDS = [0.001 * 1.25 ** i for i in range(60)]     # 1 ms up to about 9 minutes, in seconds
+
+
+class StreamingHistogram:
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        self.counts[bisect.bisect_left(BUCKET_BOUNDS, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= target:
+                return min(BUCKET_BOUNDS[i], self.max) if i < len(BUCKET_BOUNDS) else self.max
+        return self.max
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+
+class EndpointMetrics:
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.bytes = 0
+        self.last_status = 0
+        self.latency = StreamingHistogram()
+
+
+class ApiMetrics:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.total = EndpointMetrics()
+        self.endpoints = {}
+        self.polls_skipped = 0
+        self.token_refreshes = 0
+
+    # status is the HTTP status code, or 0 when the request failed before getting a response
+
+    def record(self, endpoint, latency, status, size):
+        error = not (200 <= status < 300)
+        with self.lock:
+            for metrics in (self.total, self.endpoints.setdefault(endpoint, EndpointMetrics())):
+                metrics.calls += 1
+                metrics.errors += int(error)
+                metrics.bytes += size
+                metrics.last_status = status
+                metrics.latency.add(latency)
+
+    def states(self):
+        with self.lock:
+            total = self.total
+            return [
+                {'key': "apiCalls", 'value': total.calls},
+                {'key': "apiErrors", 'value': total.errors},
+                {'key': "apiLatencyP50", 'value': round(total.latency.quantile(0.50) * 1000.0), 'uiValue': f"{total.latency.quantile(0.50) * 1000.0:.0f} ms"},
+                {'key': "apiLatencyP95", 'value': round(total.latency.quantile(0.95) * 1000.0), 'uiValue': f"{total.latency.quantile(0.95) * 1000.0:.0f} ms"},
+                {'key': "apiLatencyMax", 'value': round(total.latency.max * 1000.0), 'uiValue': f"{total.latency.max * 1000.0:.0f} ms"},
+                {'key': "apiBytes", 'value': total.bytes},
+                {'key': "apiLastStatus", 'value': total.last_status},
+                {'key': "pollsSkipped", 'value': self.polls_skipped},
+                {'key': "tokenRefreshes", 'value': self.token_refreshes},
+            ]
+
+    def report(self):
+        with self.lock:
+            lines = [f"{'endpoint':<24}{'calls':>8}{'errors':>8}{'p50 ms':>9}{'p95 ms':>9}{'max ms':>9}{'mean ms':>9}{'bytes':>12}{'last':>6}"]
+            for name, m in sorted(self.endpoints.items()) + [("total", self.total)]:
+                lines.append(f"{name:<24}{m.calls:>8}{m.errors:>8}{m.latency.quantile(0.5) * 1000.0:>9.0f}"
+                             f"{m.latency.quantile(0.95) * 1000.0:>9.0f}{m.latency.max * 1000.0:>9.0f}{m.latency.mean * 1000.0:>9.0f}"
+                             f"{m.bytes:>12}{m.last_status:>6}")
+            lines.append(f"polls skipped (no changes): {self.polls_skipped}, token refreshes: {self.token_refreshes}")
+            return "\n".join(lines)
@@ -0,0 +1,59 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#
+# Per-cycle change sets for other plugins and scripts.  After each update the tracked fields of every thermostat and
+# sensor are compared with the previous cycle, and only the ones that changed are broadcast, so subscribers can react to
+# changes instead of polling the devices.  Values are the raw Ecobee values from the snapshot (temperatures and setpoints
+# in tenths of a degree F).
+#
+#   indigo.server.subscribeToBroadcast("com.flyingdiver.indigoplugin.ecobee", "thermostatChanges", "ecobeeChanged")
+#
+# Each message is a dict: {"account": device id, "changes": [...], "removed": [...]}, where each change is
+# {"type": "thermostat" or "sensor", "id": identifier or code, "name": name, "fields": {field: new value}} and each
+# removed entry is {"type": ..., "id": ...}.  The first message after a restart lists every field of every device.
+#
+
+BROADCAST_MESSAGE = "thermostatChanges"
+
+THERMOSTAT_FIELDS = ("desiredCool", "desiredHeat", "currentClimate", "hvacMode", "equipmentStatus", "desiredFanMode",
+                     "actualTemperature", "actualHumidity", "occupancy")
+SENSOR_FIELDS = ("temperature", "humidity", "occupancy")
+
+
+def thermostat_fields(data):
+    fields = {key: data.get(key) for key in THERMOSTAT_FIELDS}
+    fields["occupancy"] = data.get("internal", {}).get("occupancy")
+    return fields
+
+
+def sensor_fields(data):
+    return {key: data.get(key) for key in SENSOR_FIELDS}
+
+
+class ChangeTracker:
+
+    def __init__(self):
+        self.previous = {}      # account device id -> {(type, id): fields}
+
+    def changes(self, accountID, thermostats, sensors):
+        """The change set for one account since its last call, or None if nothing changed."""
+        last = self.previous.get(accountID, {})
+        current = {}
+        changes = []
+        for kind, records, extract in (("thermostat", thermostats, thermostat_fields), ("sensor", sensors, sensor_fields)):
+            for key, data in records.items():
+                fields = current[(kind, key)] = extract(data)
+                before = last.get((kind, key), {})
+                changed = {field: value for field, value in fields.items() if value is not None and before.get(field) != value}
+                if changed:
+                    changes.append({"type": kind, "id": key, "name": data.get("name", ""), "fields": changed})
+        removed = [{"type": kind, "id": key} for kind, key in last if (kind, key) not in current]
+        self.previous[accountID] = current
+
+        if not changes and not removed:
+            return None
+        return {"account": accountID, "changes": changes, "removed": removed}
+
+    def forget(self, accountID):
+        self.previous.pop(accountID, None)
@@ -0,0 +1,122 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+import logging
+import os
+import threading
+import time
+
+#
+# Per-account journal of thermostat commands that couldn't be sent, so they aren't lost during an outage.  Commands
+# are kept in the order they were issued, each with an expiry time, and a newer command for the same thermostat and
+# setting replaces the queued one.  A command for several thermostats is queued as one entry per thermostat, so a
+# later command for any one of them replaces just that thermostat's part.  The journal is written to disk on every
+# change, so it survives a plugin restart.
+#
+
+
+def command_key(body):
+    """Commands with the same key supersede each other: holds and resumes share one key per thermostat, settings
+    changes have one key per thermostat and set of settings."""
+    address = body.get("selection", {}).get("selectionMatch", "")
+    if "functions" in body:
+        return f"{address}:hold"
+    return f"{address}:settings:{','.join(sorted(body.get('thermostat', {}).get('settings', {})))}"
+
+
+def split_command(body):
+    """The command as one body per thermostat identifier in its selectionMatch."""
+    selection = body.get("selection", {})
+    identifiers = [identifier for identifier in selection.get("selectionMatch", "").split(",") if identifier]
+    if len(identifiers) < 2:
+        return [body]
+    return [dict(body, selection=dict(selection, selectionMatch=identifier)) for identifier in identifiers]
+
+
+class CommandJournal:
+
+    def __init__(self, path=None):
+        self.logger = logging.getLogger("Plugin.CommandJournal")
+        self.path = path
+        self.lock = threading.Lock()
+        self.commands = []      # oldest first
+        self.load()
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as f:
+                self.commands = json.load(f)
+        except (Exception,) as e:
+            self.logger.warning(f"Unable to read command journal {self.path}, starting empty: {e}")
+            self.commands = []
+        if self.commands:
+            self.logger.info(f"Loaded {len(self.commands)} queued commands from {self.path}")
+
+    def save(self):
+        if not self.path:
+            return
+        try:
+            temp = f"{self.path}.tmp"
+            with open(temp, "w") as f:
+                json.dump(self.commands, f)
+            os.replace(temp, self.path)
+        except (Exception,) as e:
+            self.logger.error(f"Unable to save command journal {self.path}: {e}")
+
+    def add(self, body, action, ttl):
+        """Queue a command, one entry per thermostat, dropping any queued entries it supersedes.  Returns the new
+        entries and the superseded ones."""
+        now = time.time()
+        queued = [{"key": command_key(part), "body": part, "action": action, "queued": now, "expires": now + ttl, "attempts": 0}
+                  for part in split_command(body)]
+        keys = {command["key"] for command in queued}
+        with self.lock:
+            superseded = [c for c in self.commands if c["key"] in keys]
+            self.commands = [c for c in self.commands if c["key"] not in keys] + queued
+            self.save()
+        return queued, superseded
+
+    def expire(self, now=None):
+        """Remove and return the commands past their expiry time."""
+        now = now or time.time()
+        with self.lock:
+            expired = [c for c in self.commands if c["expires"] <= now]
+            if expired:
+                self.commands = [c for c in self.commands if c["expires"] > now]
+                self.save()
+        return expired
+
+    def first(self):
+        with self.lock:
+            return self.commands[0] if self.commands else None
+
+    def remove(self, command):
+        with self.lock:
+            if command in self.commands:
+                self.commands.remove(command)
+                self.save()
+
+    def attempted(self, command):
+        with self.lock:
+            command["attempts"] += 1
+            self.save()
+
+    @property
+    def depth(self):
+        return len(self.commands)
+
+    def oldest_age(self, now=None):
+        with self.lock:
+            if not self.commands:
+                return 0
+            return (now or time.time()) - self.commands[0]["queued"]
+
+    def states(self):
+        age = round(self.oldest_age())
+        return [
+            {'key': "commandQueueDepth", 'value': self.depth},
+            {'key': "commandQueueOldest", 'value': age, 'uiValue': f"{age} sec"},
+        ]
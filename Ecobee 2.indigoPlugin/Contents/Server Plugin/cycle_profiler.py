@@ -0,0 +1,112 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import contextlib
+import cProfile
+import functools
+import io
+import logging
+import os
+import pstats
+import threading
+import time
+
+#
+# On-demand cProfile capture of poll cycles, and optionally of action callbacks.  When no capture is pending the only
+# cost is an attribute check per cycle or action.
+#
+
+
+class CycleProfiler:
+
+    def __init__(self, folder):
+        self.logger = logging.getLogger("Plugin.CycleProfiler")
+        self.folder = folder
+        self.lock = threading.Lock()
+        self.cycles_remaining = 0
+        self.include_actions = False
+        self.top = 25
+        self.stats = None
+        self.started = None
+
+    def start(self, cycles, include_actions=False, top=25):
+        with self.lock:
+            self.cycles_remaining = cycles
+            self.include_actions = include_actions
+            self.top = top
+            self.stats = None
+            self.started = time.time()
+        self.logger.info(f"Profiling the next {cycles} update cycles{' and action callbacks' if include_actions else ''}")
+
+    @contextlib.contextmanager
+    def cycle(self):
+        if not self.cycles_remaining:
+            yield
+            return
+
+        profile = self._enable()
+        try:
+            yield
+        finally:
+            if profile:
+                profile.disable()
+                self._add(profile)
+            self.cycles_remaining -= 1
+            if not self.cycles_remaining:
+                self.finish()
+
+    @contextlib.contextmanager
+    def action(self):
+        if not (self.cycles_remaining and self.include_actions):
+            yield
+            return
+
+        profile = self._enable()
+        try:
+            yield
+        finally:
+            if profile:
+                profile.disable()
+                self._add(profile)
+
+    def _enable(self):
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:      # another profiler is already running on some other thread
+            self.logger.debug("Profiler busy, not profiling this call")
+            return None
+        return profile
+
+    def _add(self, profile):
+        with self.lock:
+            if self.stats:
+                self.stats.add(profile)
+            else:
+                self.stats = pstats.Stats(profile)
+
+    def finish(self):
+        with self.lock:
+            stats, self.stats = self.stats, None
+        if not stats:
+            self.logger.warning("Profiling finished without collecting any data")
+            return None
+
+        path = os.path.join(self.folder, f"profile-{time.strftime('%Y%m%d-%H%M%S', time.localtime(self.started))}.pstats")
+        stats.dump_stats(path)
+
+        summary = io.StringIO()
+        stats.stream = summary
+        stats.strip_dirs().sort_stats(pstats.SortKey.CUMULATIVE).print_stats(self.top)
+        self.logger.info(f"Profile written to {path}\n{summary.getvalue()}")
+        return path
+
+
+# Decorator for plugin action callbacks, profiles the callback while a capture that includes actions is running
+
+def profiled_action(func):
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        with self.profiler.action():
+            return func(self, *args, **kwargs)
+    return wrapper
@@ -0,0 +1,78 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import logging
+
+#
+# Index of the plugin's Indigo devices by (account, address, deviceTypeId), so creation, discovery and update
+# fan-out don't have to scan every device.  Maintained from deviceStartComm, deviceStopComm and deviceUpdated.
+#
+
+
+def account_id(dev):
+    try:
+        return int(dev.pluginProps.get("account", 0) or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+class DeviceIndex:
+
+    def __init__(self):
+        self.logger = logging.getLogger("Plugin.DeviceIndex")
+        self.entries = {}       # (account, address, deviceTypeId) -> device id
+        self.keys = {}          # device id -> (account, address, deviceTypeId)
+        self.accounts = {}      # account -> {deviceTypeId -> {address -> device id}}
+        self.addresses = {}     # deviceTypeId -> {address -> set of device ids}, across all accounts
+
+    def __contains__(self, dev_id):
+        return dev_id in self.keys
+
+    def add(self, dev):
+        key = (account_id(dev), dev.address, dev.deviceTypeId)
+        if self.keys.get(dev.id) == key:
+            return
+        self.remove(dev.id)
+
+        account, address, deviceTypeId = key
+        self.entries[key] = dev.id
+        self.keys[dev.id] = key
+        self.accounts.setdefault(account, {}).setdefault(deviceTypeId, {})[address] = dev.id
+        self.addresses.setdefault(deviceTypeId, {}).setdefault(address, set()).add(dev.id)
+        self.logger.threaddebug(f"DeviceIndex: added {dev.id} as {key}")
+
+    def remove(self, dev_id):
+        key = self.keys.pop(dev_id, None)
+        if not key:
+            return
+
+        account, address, deviceTypeId = key
+        dev_ids = self.addresses[deviceTypeId][address]
+        dev_ids.discard(dev_id)
+
+        if self.entries.get(key) == dev_id:
+            # another device with the same key (a duplicate) takes over the entry, if there is one
+            others = [other for other in dev_ids if self.keys.get(other) == key]
+            if others:
+                self.entries[key] = others[0]
+                self.accounts[account][deviceTypeId][address] = others[0]
+            else:
+                del self.entries[key]
+                del self.accounts[account][deviceTypeId][address]
+
+        if not dev_ids:
+            del self.addresses[deviceTypeId][address]
+        self.logger.threaddebug(f"DeviceIndex: removed {dev_id} from {key}")
+
+    def lookup(self, account, address, deviceTypeId):
+        return self.entries.get((int(account), address, deviceTypeId))
+
+    def account_of(self, dev_id):
+        key = self.keys.get(dev_id)
+        return key[0] if key else None
+
+    def devices(self, account, deviceTypeId):
+        return list(self.accounts.get(int(account), {}).get(deviceTypeId, {}).values())
+
+    def active_addresses(self, deviceTypeId):
+        return self.addresses.get(deviceTypeId, {}).keys()
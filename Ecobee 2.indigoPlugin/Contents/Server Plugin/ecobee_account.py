@@ -2,20 +2,58 @@
 # -*- coding: utf-8 -*-
 
 import requests
+import calendar
 import json
+import os
+import threading
 import time
 import logging
 
 import indigo
 
+import json_codec
+import program_schedule
+from api_metrics import ApiMetrics
+from command_journal import CommandJournal
+from ecobee_transport import LiveTransport
+from tracing import THREADDEBUG, LazyJson, tracer
+
 #
 # All interactions with the Ecobee servers are encapsulated in this class
 #
 
 API_KEY = "opSMO6RtoUlhoAtlQehNZdaOZ6EQBO6Q"    # specific to this plugin
+API_URL = "https://api.ecobee.com"              # can be pointed at a local mock server for benchmarking
+
+# make_request outcomes
+COMMAND_SENT = "sent"
+COMMAND_FAILED = "failed"       # rejected by Ecobee, retrying won't help
+COMMAND_RETRY = "retry"         # not delivered, queue it and try again later
+COMMAND_QUEUED = "queued"       # in the journal, to be sent when Ecobee can be reached
+
+WEATHER_UNKNOWN = -5002         # Ecobee's value for a weather reading it doesn't have
+WEATHER_RETRY = 600.0           # seconds before trying again after a failed weather fetch
+
+
+def command_outcome(queued):
+    """The outcome of a queued command from its journal entries: sent once every part was, failed if any part was
+    rejected, otherwise still queued."""
+    results = [command.get("result", COMMAND_QUEUED) for command in queued]
+    if COMMAND_QUEUED in results:
+        return COMMAND_QUEUED
+    if COMMAND_FAILED in results:
+        return COMMAND_FAILED
+    return COMMAND_SENT
 
 
 class EcobeeAccount:
+    transport = LiveTransport()     # replaced by the plugin when recording or replaying API traffic
+    change_detection = False        # check the thermostat summary revisions before fetching everything
+    evict_after = 3                 # fetches a thermostat or sensor can be missing before it's dropped
+    journal_folder = None           # where the per-account command journals are kept, in memory only when None
+    command_ttl = 1800.0            # seconds a queued command stays valid
+    include_weather = False         # fetch the thermostats' weather, on its own slower schedule
+    weather_ttl = 3600.0            # seconds from Ecobee's last weather refresh to the next fetch
 
     def __init__(self, dev, refresh_token=None):
         self.logger = logging.getLogger("Plugin.EcobeeAccount")
@@ -26,11 +64,21 @@ class EcobeeAccount:
         self.access_token = None
         self.refresh_token = None
         self.authorization_code = None
+        self.metrics = ApiMetrics()
+        self.revisions = None
+        self.journal = None
+        self.replay_lock = threading.Lock()
+        self.identifiers = frozenset()      # thermostats seen in this account's own last fetch
+        self.generation = 0                 # count of full fetches, each record is stamped with the one it was last seen in
+        self.shared_with = None             # account whose snapshot this one is using instead of polling
+        self.weather = {}                   # thermostat identifier -> current conditions, refreshed separately
+        self.next_weather = 0.0
 
         if not dev:  # temp account objects created during PIN authentication don't have an associated device
             return
 
         self.devID = dev.id
+        self.journal = CommandJournal(os.path.join(self.journal_folder, f"commands-{dev.id}.json") if self.journal_folder else None)
 
         if refresh_token:
             self.logger.info(f"{dev.name}: EcobeeAccount created using refresh token = {refresh_token}")
@@ -39,19 +87,32 @@ class EcobeeAccount:
 
         #   Ecobee Authentication functions
 
+    # All API calls go through here, so every one of them is timed and counted
+
+    def api_call(self, method, endpoint, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = self.transport.request(method, f'{API_URL}{endpoint}', **kwargs)
+        except requests.RequestException:
+            self.metrics.record(endpoint, time.perf_counter() - start, 0, 0)
+            raise
+        self.metrics.record(endpoint, time.perf_counter() - start, response.status_code, len(response.content))
+        return response
+
     # Authentication Step 1
     def request_pin(self):
 
         params = {'response_type': 'ecobeePin', 'client_id': API_KEY, 'scope': 'smartWrite'}
         try:
-            request = requests.get('https://api.ecobee.com/authorize', params=params)
+            request = self.api_call('GET', '/authorize', params=params)
         except requests.RequestException as e:
             self.logger.error(f"PIN Request Error, exception = {e}")
             return None
 
         if request.status_code == requests.codes.ok:
-            self.authorization_code = request.json()['code']
-            pin = request.json()['ecobeePin']
+            data = json_codec.decode(request)
+            self.authorization_code = data['code']
+            pin = data['ecobeePin']
             self.logger.info(f"PIN Request OK, pin = {pin}")
             return pin
 
@@ -66,7 +127,7 @@ class EcobeeAccount:
 
         params = {'grant_type': 'ecobeePin', 'code': self.authorization_code, 'client_id': API_KEY, 'ecobee_type': 'jwt'}
         try:
-            request = requests.post('https://api.ecobee.com/token', params=params)
+            request = self.api_call('POST', '/token', params=params)
         except requests.RequestException as e:
             self.logger.error(f"Token Request Error, exception = {e}")
             self.authenticated = False
@@ -74,9 +135,10 @@ class EcobeeAccount:
 
         if request.status_code == requests.codes.ok:
             self.logger.info("Token Request OK")
-            self.access_token = request.json()['access_token']
-            self.refresh_token = request.json()['refresh_token']
-            self.next_refresh = time.time() + (float(request.json()['expires_in']) * 0.80)
+            data = json_codec.decode(request)
+            self.access_token = data['access_token']
+            self.refresh_token = data['refresh_token']
+            self.next_refresh = time.time() + (float(data['expires_in']) * 0.80)
             self.authenticated = True
         else:
             self.logger.error("Token Request failed, response = '{}'".format(request.text))
@@ -94,31 +156,33 @@ class EcobeeAccount:
 
         params = {'grant_type': 'refresh_token', 'refresh_token': self.refresh_token, 'client_id': API_KEY, 'ecobee_type': 'jwt'}
         try:
-            request = requests.post('https://api.ecobee.com/token', params=params)
+            request = self.api_call('POST', '/token', params=params)
         except requests.RequestException as e:
             self.logger.warning(f"Token Refresh Error, exception = {e}")
             self.next_refresh = time.time() + 300.0  # try again in five minutes
             return
 
+        data = json_codec.decode(request) or {}
         if request.status_code == requests.codes.ok:
-            if self.access_token and request.json()['access_token'] == self.access_token:
+            if self.access_token and data['access_token'] == self.access_token:
                 self.logger.debug(f"{dev.name}: Access Token did not change")
             else:
-                self.access_token = request.json()['access_token']
+                self.access_token = data['access_token']
                 self.logger.debug(f"{dev.name}: Token Refresh OK, new Access Token")
 
-            if self.refresh_token and request.json()['refresh_token'] == self.refresh_token:
+            if self.refresh_token and data['refresh_token'] == self.refresh_token:
                 self.logger.debug(f"{dev.name}: Refresh Token did not change")
             else:
-                self.refresh_token = request.json()['refresh_token']
+                self.refresh_token = data['refresh_token']
                 self.logger.info(f"{dev.name}: Token Refresh OK, new refresh_token: {self.refresh_token}")
 
-            self.next_refresh = time.time() + (float(request.json()['expires_in']) * 0.80)
+            self.next_refresh = time.time() + (float(data['expires_in']) * 0.80)
             self.authenticated = True
+            self.metrics.token_refreshes += 1
             return
 
         try:
-            error = request.json()['error']
+            error = data['error']
             if error == 'invalid_grant':
                 self.logger.error(f"{dev.name}: Token refresh failed, will retry in 5 minutes.")
                 self.authenticated = False
@@ -131,14 +195,44 @@ class EcobeeAccount:
 
     #   Ecobee API functions
 
-    #   Request all thermostat data from the Ecobee servers.
+    #   Check the thermostat summary to see if anything changed since the last full update.  This is the polling
+    #   pattern Ecobee recommends: the revisions only change when the thermostat data does.
+
+    def revisions_changed(self, header):
+        params = {'json': '{"selection":{"selectionType":"registered","selectionMatch":""}}'}
+        try:
+            request = self.api_call('GET', '/1/thermostatSummary', headers=header, params=params)
+        except requests.RequestException:
+            return None
+
+        if request.status_code != requests.codes.ok:
+            return None
+
+        revisions = (json_codec.decode(request) or {}).get('revisionList')
+        if revisions is None:
+            return None
+        return revisions if revisions != self.revisions else False
+
+    #   Request all thermostat data from the Ecobee servers.  Returns True if new data was received.
 
-    def server_update(self):
+    def server_update(self, force=False):
 
         dev = indigo.devices[self.devID]
+        self.stop_sharing()
 
         header = {'Content-Type': 'application/json;charset=UTF-8',
                   'Authorization': 'Bearer ' + self.access_token}
+
+        revisions = None
+        if self.change_detection and not force:
+            with tracer.span("summary", account=self.devID) as span:
+                revisions = self.revisions_changed(header)
+                span.set(changed=revisions is not False)
+            if revisions is False:
+                self.metrics.polls_skipped += 1
+                self.logger.debug(f"{dev.name}: No changes reported by Ecobee, skipping update")
+                self.confirm_fresh()
+                return False
         params = {'json': ('{"selection":{"selectionType":"registered",'
                            '"includeRuntime":"true",'
                            '"includeSensors":"true",'
@@ -146,114 +240,314 @@ class EcobeeAccount:
                            '"includeProgram":"true",'
                            '"includeEquipmentStatus":"true",'
                            '"includeSettings":"true"}}')}
-        try:
-            request = requests.get('https://api.ecobee.com/1/thermostat', headers=header, params=params)
-        except requests.RequestException as e:
-            self.logger.error(f"{dev.name}: Ecobee Account Update Error, exception = {e}")
-            return
+        with tracer.span("fetch", account=self.devID) as span:
+            try:
+                request = self.api_call('GET', '/1/thermostat', headers=header, params=params)
+            except requests.RequestException as e:
+                self.logger.error(f"{dev.name}: Ecobee Account Update Error, exception = {e}")
+                return False
+            span.set(status=request.status_code, bytes=len(request.content))
 
         if request.status_code != requests.codes.ok:
             self.logger.error(f"{dev.name}: Ecobee Account Update failed, response = '{request.text}'")
-            return
+            return False
 
-        stat_data = request.json()['thermostatList']
-        status = request.json()['status']
+        data = json_codec.decode(request)
+        stat_data = data['thermostatList']
+        status = data['status']
         if status["code"] == 0:
             self.logger.debug(f"{dev.name}: Ecobee Account Update OK, got info on {len(stat_data)} thermostats")
         else:
             self.logger.warning(f"{dev.name}: Ecobee Account Update Error, code  = {status['code']}, message = {status['message']}.")
-            return
+            return False
 
-        self.logger.threaddebug(json.dumps(stat_data, sort_keys=True, indent=4, separators=(',', ': ')))
+        self.logger.threaddebug("%s", LazyJson(stat_data))
 
         # Extract the relevant info from the server data and put it in a convenient Dict form
 
+        self.generation += 1
+        with tracer.span("parse", account=self.devID, thermostats=len(stat_data)):
+            self.parse_thermostats(dev, stat_data, time.time(), self.generation)
+        self.evict(dev)
+        self.identifiers = frozenset(therm["identifier"] for therm in stat_data)
+
+        dev.updateStateOnServer(key="last_update", value=time.strftime("%d %b %Y %H:%M:%S"))
+        self.revisions = revisions or None
+
+        if self.logger.isEnabledFor(THREADDEBUG):
+            self.logger.threaddebug("Thermostat Update, thermostats =\n%s\nsensors = %s\n", LazyJson(self.thermostats), LazyJson(self.sensors))
+        return True
+
+    # Build the snapshot directly from the decoded payload.  Only the fields the devices use are kept, the rest of the
+    # payload is dropped with it.
+
+    def parse_thermostats(self, dev, stat_data, fetched, generation):
         for therm in stat_data:
-            self.logger.debug(f"{dev.name}: getting data for '{therm[u'name']}', {therm[u'identifier']}")
+            self.logger.debug("%s: getting data for '%s', %s", dev.name, therm['name'], therm['identifier'])
 
             identifier = therm["identifier"]
-            self.thermostats[identifier] = {
+            runtime = therm["runtime"]
+            settings = therm["settings"]
+            program = therm["program"]
+            events = therm.get('events')
+            remotes = {}
+            internal = None
+
+            for remote in therm["remoteSensors"]:
+                remote_type = remote["type"]
+
+                if remote_type == "ecobee3_remote_sensor":
+                    self.logger.debug("%s: getting data for remote sensor '%s', %s", dev.name, remote['name'], remote['code'])
+                    remote_data = {"name": remote["name"], "thermostat": identifier, "fetched": fetched, "generation": generation}
+                    for cap in remote["capability"]:
+                        remote_data[cap["type"]] = cap["value"]
+                    self.sensors[remote["code"]] = remotes[remote["code"]] = remote_data
+
+                elif remote_type == "thermostat":
+                    internal = {cap["type"]: cap["value"] for cap in remote["capability"]}
+
+                elif remote_type == "monitor_sensor":
+                    internal = {cap["type"]: cap["value"] for cap in remote["capability"] if cap["type"] == "occupancy"}
+
+            thermostat = {
                 "name": therm["name"],
                 "brand": therm["brand"],
                 "features": therm["features"],
                 "modelNumber": therm["modelNumber"],
                 "equipmentStatus": therm["equipmentStatus"],
-                "currentClimate": therm["program"]["currentClimateRef"],
-                "hvacMode": therm["settings"]["hvacMode"],
-                "fanMinOnTime": therm["settings"]["fanMinOnTime"],
-                "desiredCool": therm["runtime"]["desiredCool"],
-                "desiredHeat": therm["runtime"]["desiredHeat"],
-                "actualTemperature": therm["runtime"]["actualTemperature"],
-                "actualHumidity": therm["runtime"]["actualHumidity"],
-                "desiredFanMode": therm["runtime"]["desiredFanMode"]
+                "currentClimate": program["currentClimateRef"],
+                "hvacMode": settings["hvacMode"],
+                "fanMinOnTime": settings["fanMinOnTime"],
+                "desiredCool": runtime["desiredCool"],
+                "desiredHeat": runtime["desiredHeat"],
+                "actualTemperature": runtime["actualTemperature"],
+                "actualHumidity": runtime["actualHumidity"],
+                "desiredFanMode": runtime["desiredFanMode"],
+                "latestEventType": events[0].get('type') if events else None,
+                "climates": {c["climateRef"]: c["name"] for c in program["climates"]},
+                "schedule": program_schedule.transition_index(program.get("schedule")),
+                "utcOffset": program_schedule.utc_offset(therm.get("thermostatTime"), therm.get("utcTime")),
+                "remotes": remotes,
+                "fetched": fetched,
+                "generation": generation,
             }
+            if internal is not None:
+                thermostat["internal"] = internal
+            self.thermostats[identifier] = thermostat
 
-            if therm.get('events') and len(therm.get('events')) > 0:
-                self.thermostats[identifier]["latestEventType"] = therm.get('events')[0].get('type')
-            else:
-                self.thermostats[identifier]["latestEventType"] = None
+    #   Time of the earliest scheduled climate change among this account's thermostats, or None if none have one
 
-            climates = {}
-            for c in therm["program"]["climates"]:
-                climates[c["climateRef"]] = c["name"]
-            self.thermostats[identifier]["climates"] = climates
+    def next_transition(self, now=None):
+        upcoming = [program_schedule.next_transition(data["schedule"], data["utcOffset"], now)
+                    for data in self.thermostats.values() if "schedule" in data]
+        return min((when for climate, when in filter(None, upcoming)), default=None)
 
-            remotes = {}
-            for remote in therm[u"remoteSensors"]:
+    #   Weather is on a slower tier than the runtime data.  Ecobee only refreshes it about hourly, so it's fetched on
+    #   its own request, no sooner than weather_ttl after Ecobee's last refresh, and cached per thermostat in between.
 
-                if remote["type"] == "ecobee3_remote_sensor":
-                    self.logger.debug(f"{dev.name}: getting data for remote sensor '{remote[u'name']}', {remote[u'code']}")
-                    code = remote[u"code"]
-                    remote_data = {u"name": remote[u"name"], u"thermostat": identifier}
-                    for cap in remote["capability"]:
-                        remote_data[cap["type"]] = cap["value"]
-                    self.sensors[code] = remote_data
-                    remotes[code] = remote_data
+    def weather_due(self, now=None):
+        return self.include_weather and (now or time.time()) >= self.next_weather
 
-                elif remote["type"] == "thermostat":
-                    internal = {}
-                    for cap in remote["capability"]:
-                        internal[cap["type"]] = cap["value"]
-                    self.thermostats[identifier]["internal"] = internal
+    def weather_update(self):
 
-                elif remote["type"] == "monitor_sensor":
-                    internal = {}
-                    for cap in remote["capability"]:
-                        if cap["type"] == "occupancy":
-                            internal[cap["type"]] = cap["value"]
-                    self.thermostats[identifier]["internal"] = internal
+        dev = indigo.devices[self.devID]
+        now = time.time()
+        self.next_weather = now + WEATHER_RETRY
 
-            self.thermostats[identifier]["remotes"] = remotes
+        header = {'Content-Type': 'application/json;charset=UTF-8',
+                  'Authorization': 'Bearer ' + self.access_token}
+        params = {'json': '{"selection":{"selectionType":"registered","selectionMatch":"","includeWeather":"true"}}'}
+        with tracer.span("weather", account=self.devID) as span:
+            try:
+                request = self.api_call('GET', '/1/thermostat', headers=header, params=params)
+            except requests.RequestException as e:
+                self.logger.warning(f"{dev.name}: Ecobee Weather Update Error, exception = {e}")
+                return False
+            span.set(status=request.status_code, bytes=len(request.content))
+
+        data = json_codec.decode(request) or {}
+        if request.status_code != requests.codes.ok or data.get('status', {}).get('code') != 0:
+            self.logger.warning(f"{dev.name}: Ecobee Weather Update failed, response = '{request.text}'")
+            return False
+
+        refreshed = []
+        for therm in data.get('thermostatList', []):
+            weather = self.parse_weather(therm.get('weather'), now)
+            if weather:
+                self.weather[therm["identifier"]] = weather
+                refreshed.append(weather["timestamp"])
+        # due weather_ttl after Ecobee's oldest refresh when that's still ahead, otherwise weather_ttl after this fetch
+        due = min(refreshed, default=now) + self.weather_ttl
+        self.next_weather = due if now < due < now + self.weather_ttl else now + self.weather_ttl
+        self.logger.debug(f"{dev.name}: Ecobee Weather Update OK, {len(refreshed)} thermostats, next at {time.strftime('%H:%M', time.localtime(self.next_weather))}")
+        return True
+
+    @staticmethod
+    def parse_weather(weather, fetched):
+        forecasts = weather and weather.get("forecasts")
+        if not forecasts:
+            return None
+        current = forecasts[0]
 
-        dev.updateStateOnServer(key="last_update", value=time.strftime("%d %b %Y %H:%M:%S"))
+        def known(key):
+            value = current.get(key)
+            return None if value == WEATHER_UNKNOWN else value
 
-        self.logger.threaddebug(
-            f"Thermostat Update, thermostats =\n{json.dumps(self.thermostats, sort_keys=True, indent=4, separators=(',', ': '))}\nsensors = {json.dumps(self.sensors, sort_keys=True, indent=4, separators=(',', ': '))}\n")
+        try:
+            timestamp = calendar.timegm(time.strptime(weather["timestamp"], "%Y-%m-%d %H:%M:%S"))     # UTC
+        except (Exception,):
+            timestamp = fetched
+        return {
+            "timestamp": timestamp,
+            "fetched": fetched,
+            "station": weather.get("weatherStation", ""),
+            "condition": current.get("condition", ""),
+            "temperature": known("temperature"),
+            "humidity": known("relativeHumidity"),
+            "tempHigh": known("tempHigh"),
+            "tempLow": known("tempLow"),
+            "windSpeed": known("windSpeed"),
+            "pop": known("pop"),
+        }
+
+    #   Drop thermostats and sensors that haven't been in the last evict_after fetches, so removed hardware doesn't
+    #   linger in the device lists and the update loop.
+
+    def evict(self, dev):
+        oldest = self.generation - self.evict_after
+        for kind, records in (("thermostat", self.thermostats), ("sensor", self.sensors)):
+            for key in [key for key, data in records.items() if data.get("generation", 0) <= oldest]:
+                self.logger.info(f"{dev.name}: {kind} '{records[key]['name']}' ({key}) not reported in the last {self.evict_after} updates, removed")
+                del records[key]
+        for key in [key for key in self.weather if key not in self.thermostats]:
+            del self.weather[key]
+
+    #   The summary says nothing changed, so the cached data is as good as a new fetch.  Every cached thermostat and
+    #   sensor gets the new fetch time, which keeps the devices from going stale between real fetches.
+
+    def confirm_fresh(self):
+        now = time.time()
+        for data in self.thermostats.values():
+            data["fetched"] = now
+        for data in self.sensors.values():
+            data["fetched"] = now
+
+    #   Another account device is authorized against the same Ecobee login, so use its snapshot instead of polling.
+    #   The dicts are shared, not copied, so they always hold the other account's latest data.
+
+    def share_snapshot(self, primary):
+        if self.shared_with != primary.devID:
+            self.thermostats = primary.thermostats
+            self.sensors = primary.sensors
+            self.weather = primary.weather
+            self.revisions = None
+            self.shared_with = primary.devID
+
+    #   Going back to polling.  Start from a copy of the shared data, so the devices keep their cached values if the
+    #   first fetch fails, without this account's updates touching the other account's data.
+
+    def stop_sharing(self):
+        if self.shared_with is not None:
+            # the copies are stamped with this account's generation, the sharing account's count means nothing here
+            self.thermostats = {key: dict(value, generation=self.generation) for key, value in self.thermostats.items()}
+            self.sensors = {key: dict(value, generation=self.generation) for key, value in self.sensors.items()}
+            self.weather = dict(self.weather)
+            self.shared_with = None
+
+    def publish_metrics(self):
+        indigo.devices[self.devID].updateStatesOnServer(self.metrics.states() + self.journal.states())
+
+    def status(self):
+        """Copy of the cached snapshot and counters for the status server.  Each record keeps its fetched timestamp, so
+        readers can judge freshness themselves."""
+        return {
+            "name": indigo.devices[self.devID].name,
+            "authenticated": self.authenticated,
+            "sharedWith": self.shared_with,
+            "generation": self.generation,
+            "thermostats": {key: dict(value) for key, value in self.thermostats.items()},
+            "sensors": {key: dict(value) for key, value in self.sensors.items()},
+            "weather": {key: dict(value) for key, value in self.weather.items()},
+            "metrics": {state['key']: state['value'] for state in self.metrics.states() + self.journal.states()},
+        }
 
     def dump_data(self):
 
         self.logger.info(json.dumps(self.thermostats, sort_keys=True, indent=4, separators=(',', ': ')))
         self.logger.info(json.dumps(self.sensors, sort_keys=True, indent=4, separators=(',', ': ')))
 
-    #   Generic routine for other API calls
+    #   Generic routine for other API calls.  Commands that can't be delivered now are queued in the journal, and
+    #   while anything is queued new commands go behind it so they still reach the thermostat in order.
 
     def make_request(self, body, log_msg_action):
-        url = 'https://api.ecobee.com/1/thermostat'
+        if self.journal.depth or not self.authenticated:
+            queued = self.queue_command(body, log_msg_action)
+            self.replay_commands()
+            return command_outcome(queued)
+        result = self.send_command(body, log_msg_action)
+        if result == COMMAND_RETRY:
+            self.queue_command(body, log_msg_action)
+            return COMMAND_QUEUED
+        return result
+
+    def send_command(self, body, log_msg_action):
         header = {'Content-Type': 'application/json;charset=UTF-8',
                   'Authorization': 'Bearer ' + self.access_token}
         params = {'format': 'json'}
-        try:
-            request = requests.post(url, headers=header, params=params, json=body)
-        except RequestException:
-            self.logger.error(f"API Error connecting to Ecobee.  Possible connectivity outage. Could not make request: {log_msg_action}")
-            return None
+        with tracer.span("command", account=self.devID, action=log_msg_action) as span:
+            try:
+                request = self.api_call('POST', '/1/thermostat', headers=header, params=params, json=body)
+            except requests.RequestException:
+                self.logger.warning(f"API Error connecting to Ecobee.  Possible connectivity outage. Could not make request: {log_msg_action}")
+                return COMMAND_RETRY
+            span.set(status=request.status_code)
 
         if not request.status_code == requests.codes.ok:
             self.logger.warning(f"API '{log_msg_action}' request failed, result = {request.text}")
-            return None
+            # server errors (including an expired access token) and auth failures can succeed later
+            return COMMAND_RETRY if request.status_code >= 500 or request.status_code == 401 else COMMAND_FAILED
 
-        serverStatus = request.json()['status']
+        serverStatus = json_codec.decode(request)['status']
         if serverStatus["code"] == 0:
             self.logger.debug(f"API '{log_msg_action}' request completed, result = {request}")
-        else:
-            self.logger.warning(f"API '{log_msg_action}' request error, code  = {serverStatus['code']}, message = {serverStatus['message']}.")
+            return COMMAND_SENT
+        self.logger.warning(f"API '{log_msg_action}' request error, code  = {serverStatus['code']}, message = {serverStatus['message']}.")
+        return COMMAND_FAILED
+
+    def queue_command(self, body, log_msg_action):
+        dev = indigo.devices[self.devID]
+        queued, superseded = self.journal.add(body, log_msg_action, self.command_ttl)
+        for command in superseded:
+            self.logger.info(f"{dev.name}: Queued '{command['action']}' replaced by '{log_msg_action}'")
+        self.logger.info(f"{dev.name}: Queued '{log_msg_action}' until Ecobee can be reached, {self.journal.depth} commands waiting")
+        dev.updateStatesOnServer(self.journal.states())
+        return queued
+
+    #   Send the queued commands, oldest first, stopping at the first one that still can't be delivered.
+
+    def replay_commands(self):
+        if not self.journal or not self.journal.depth:
+            return
+        if not self.replay_lock.acquire(blocking=False):     # already replaying on another thread
+            return
+        try:
+            dev = indigo.devices[self.devID]
+            for command in self.journal.expire():
+                self.logger.warning(f"{dev.name}: Queued '{command['action']}' expired after {command['attempts']} attempts, not sent")
+
+            while self.authenticated:
+                command = self.journal.first()
+                if not command:
+                    break
+                result = self.send_command(command["body"], command["action"])
+                if result == COMMAND_RETRY:
+                    self.journal.attempted(command)
+                    break
+                command["result"] = result
+                self.journal.remove(command)
+                if result == COMMAND_SENT:
+                    self.logger.info(f"{dev.name}: Sent queued '{command['action']}', queued {time.time() - command['queued']:.0f} seconds ago")
+
+            dev.updateStatesOnServer(self.journal.states())
+        finally:
+            self.replay_lock.release()
@@ -2,8 +2,13 @@
 # -*- coding: utf-8 -*-
 
 import temperature_scale
+import ecobee_models
+import program_schedule
 import indigo
 import logging
+import time
+
+from ring_buffer import RingBuffer
 
 HVAC_MODE_MAP = {
     'heat': indigo.kHvacMode.Heat,
@@ -18,9 +23,50 @@ FAN_MODE_MAP = {
     'on': indigo.kFanMode.AlwaysOn
 }
 
+TRANSITION_TIME_FORMAT = '%Y-%m-%d %H:%M'
+
+
+# Ecobee reports capability values as strings, and a reading the sensor doesn't have as "unknown"
+
+def number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def occupancy(value):
+    return {'true': True, 'false': False}.get(str(value).lower())
+
+
+# Request bodies for thermostat commands.  match is a thermostat identifier, or several comma separated when a group
+# action sends one request for all the selected thermostats on an account.
+
+def hvac_mode_body(match, hvac_mode):
+    return {
+        "selection": {"selectionType": "thermostats", "selectionMatch": match},
+        "thermostat": {"settings": {"hvacMode": hvac_mode}}
+    }
+
+
+def climate_hold_body(match, climate, hold_type):
+    return {
+        "selection": {"selectionType": "thermostats", "selectionMatch": match},
+        "functions": [{"type": "setHold", "params": {"holdType": hold_type, "holdClimateRef": climate}}]
+    }
+
+
+def resume_program_body(match):
+    return {
+        "selection": {"selectionType": "thermostats", "selectionMatch": match},
+        "functions": [{"type": "resumeProgram", "params": {"resumeAll": "False"}}]
+    }
+
 
 class EcobeeDevice(object):
     temperatureFormatter = temperature_scale.Fahrenheit()
+    recentCapacity = 288
+    staleAfter = 2700.0     # seconds before cached Ecobee data is flagged as stale
 
     def __init__(self, dev):
         self.logger = logging.getLogger('Plugin.ecobee_devices')
@@ -28,9 +74,75 @@ class EcobeeDevice(object):
         self.address = dev.address
         self.name = dev.name
         self.ecobee = None
+        self.recent = RingBuffer(EcobeeDevice.recentCapacity)
 
         self.logger.threaddebug(f"{dev.name}: EcobeeDevice __init__ starting, pluginProps =\n{dev.pluginProps}")
 
+        # reporting deadbands.  A reading is only pushed to Indigo when it has moved by at least the delta,
+        # or when the last reported value is older than the max age.
+
+        self.temperatureDelta = self.float_prop(dev, 'reportTempDelta')
+        self.humidityDelta = self.float_prop(dev, 'reportHumidityDelta')
+        self.reportMaxAge = self.float_prop(dev, 'reportMaxAge', 60.0) * 60.0
+        self.reported = {}
+        self.suppressed = int(dev.states.get('suppressedUpdates', 0) or 0)
+        self.stale = None
+        self.orphaned = None
+
+    @staticmethod
+    def float_prop(dev, key, default=0.0):
+        try:
+            return float(dev.pluginProps.get(key, default) or default)
+        except ValueError:
+            return default
+
+    # The account no longer reports this device's thermostat or sensor.  Flagged with an error state until it comes back,
+    # set after the isOrphaned write and again on every update, since any state update clears it.
+
+    def set_orphaned(self, device, orphaned):
+        if orphaned != self.orphaned:
+            if orphaned:
+                self.logger.warning(f"{device.name}: {self.address} is no longer reported by the Ecobee account")
+            elif self.orphaned:
+                self.logger.info(f"{device.name}: {self.address} is reported by the Ecobee account again")
+                self.stale = None       # so freshness() writes isStale again
+            self.orphaned = orphaned
+            device.updateStateOnServer(key="isOrphaned", value=orphaned)
+        if orphaned:
+            device.setErrorStateOnServer("removed")
+
+    # dataAge and isStale state updates for the cached data the device is being updated from.  isStale is only written
+    # when staleness changes.
+
+    def freshness(self, device, data):
+        age = round(time.time() - data.get('fetched', 0.0))
+        stale = age > EcobeeDevice.staleAfter
+        update_list = [{'key': "dataAge", 'value': age, 'uiValue': f"{age} sec"}]
+        if stale != self.stale:
+            if stale:
+                self.logger.warning(f"{device.name}: Ecobee data is stale, last fetched {age} seconds ago")
+            elif self.stale:
+                self.logger.info(f"{device.name}: Ecobee data is current again")
+            self.stale = stale
+            update_list.append({'key': "isStale", 'value': stale})
+        return update_list
+
+    # Any state update clears a device's error state in Indigo, so this runs after the update's last state write, and
+    # sets the error again on every update while the data is stale.
+
+    def show_error_state(self, device):
+        if self.stale:
+            device.setErrorStateOnServer("stale")
+
+    def should_report(self, key, value, delta):
+        now = time.time()
+        last = self.reported.get(key)
+        if last and delta > 0.0 and abs(value - last[0]) < delta and (now - last[1]) < self.reportMaxAge:
+            self.suppressed += 1
+            return False
+        self.reported[key] = (value, now)
+        return True
+
 
 class EcobeeThermostat(EcobeeDevice):
 
@@ -58,7 +170,7 @@ class EcobeeThermostat(EcobeeDevice):
 
     def update(self):
 
-        self.logger.debug(f"{self.name}: Updating device")
+        self.logger.debug("%s: Updating device", self.name)
         device = indigo.devices[self.devID]
 
         # has the Ecobee account been initialized yet?
@@ -80,15 +192,13 @@ class EcobeeThermostat(EcobeeDevice):
                 self.logger.info(f"not authenticated to Ecobee servers yet; not initializing state of device {self.address}")
                 return
 
-        try:
-            thermostat_data = self.ecobee.thermostats[self.address]
-        except (Exception,):
-            self.logger.debug(f"update: error in thermostat data for address {self.address}")
+        thermostat_data = self.ecobee.thermostats.get(self.address)
+        if not thermostat_data:
+            self.logger.debug(f"update: no thermostat data found for address {self.address}")
+            self.set_orphaned(device, self.ecobee.generation > 0)
+            indigo.activePlugin.zones.report(self.devID, None, None)
             return
-        else:
-            if not thermostat_data:
-                self.logger.debug(f"update: no thermostat data found for address {self.address}")
-                return
+        self.set_orphaned(device, False)
 
         # fixup code
         try:
@@ -103,32 +213,26 @@ class EcobeeThermostat(EcobeeDevice):
             pass
             ###################
 
-        self.logger.debug(f"{self.name}: {thermostat_data=}")
+        self.logger.debug("%s: thermostat_data=%r", self.name, thermostat_data)
 
         update_list = [{'key': "latestEventType", 'value': thermostat_data.get('latestEventType')}]
 
         hsp = thermostat_data.get('desiredHeat')
-        self.lastHeatSetpoint = EcobeeDevice.temperatureFormatter.convertFromEcobee(hsp)
-        self.logger.debug(f"{device.name}: Reported hsp: {hsp}, converted hsp: {self.lastHeatSetpoint}")
-        update_list.append({'key': "setpointHeat",
-                            'value': EcobeeDevice.temperatureFormatter.convertFromEcobee(hsp),
-                            'uiValue': EcobeeDevice.temperatureFormatter.format(hsp),
-                            'decimalPlaces': 1})
-
         csp = thermostat_data.get('desiredCool')
-        self.lastCoolSetpoint = EcobeeDevice.temperatureFormatter.convertFromEcobee(csp)
-        self.logger.debug(f"{device.name}: Reported csp: {csp}, converted csp: {self.lastCoolSetpoint}")
-        update_list.append({'key': "setpointCool",
-                            'value': EcobeeDevice.temperatureFormatter.convertFromEcobee(csp),
-                            'uiValue': EcobeeDevice.temperatureFormatter.format(csp),
-                            'decimalPlaces': 1})
-
         dispTemp = thermostat_data.get('actualTemperature')
-        self.logger.debug(f"{device.name}: Reported dispTemp: {dispTemp}, converted dispTemp: {EcobeeDevice.temperatureFormatter.convertFromEcobee(dispTemp)}")
-        update_list.append({'key': "temperatureInput1",
-                            'value': EcobeeDevice.temperatureFormatter.convertFromEcobee(dispTemp),
-                            'uiValue': EcobeeDevice.temperatureFormatter.format(dispTemp),
-                            'decimalPlaces': 1})
+        (heatValue, heatUi), (coolValue, coolUi), (dispValue, dispUi) = EcobeeDevice.temperatureFormatter.readings((hsp, csp, dispTemp))
+
+        self.lastHeatSetpoint = heatValue
+        self.logger.debug("%s: Reported hsp: %s, converted hsp: %s", device.name, hsp, heatValue)
+        update_list.append({'key': "setpointHeat", 'value': heatValue, 'uiValue': heatUi, 'decimalPlaces': 1})
+
+        self.lastCoolSetpoint = coolValue
+        self.logger.debug("%s: Reported csp: %s, converted csp: %s", device.name, csp, coolValue)
+        update_list.append({'key': "setpointCool", 'value': coolValue, 'uiValue': coolUi, 'decimalPlaces': 1})
+
+        self.logger.debug("%s: Reported dispTemp: %s, converted dispTemp: %s", device.name, dispTemp, dispValue)
+        if self.should_report("temperatureInput1", dispValue, self.temperatureDelta):
+            update_list.append({'key': "temperatureInput1", 'value': dispValue, 'uiValue': dispUi, 'decimalPlaces': 1})
 
         climate = thermostat_data.get('currentClimate')
         update_list.append({'key': "climate", 'value': climate})
@@ -140,8 +244,9 @@ class EcobeeThermostat(EcobeeDevice):
         fanMode = thermostat_data.get('desiredFanMode')
         update_list.append({'key': "hvacFanMode", 'value': int(FAN_MODE_MAP[fanMode])})
 
-        hum = thermostat_data.get('actualHumidity')
-        update_list.append({'key': "humidityInput1", 'value': float(hum)})
+        hum = number(thermostat_data.get('actualHumidity'))
+        if hum is not None and self.should_report("humidityInput1", hum, self.humidityDelta):
+            update_list.append({'key': "humidityInput1", 'value': hum})
 
         fanMinOnTime = thermostat_data.get('fanMinOnTime')
         update_list.append({'key': "fanMinOnTime", 'value': fanMinOnTime})
@@ -161,25 +266,52 @@ class EcobeeThermostat(EcobeeDevice):
         device_type = thermostat_data.get('modelNumber')
         update_list.append({'key': "device_type", 'value': device_type})
 
-        if device_type in ['athenaSmart', 'nikeSmart', 'apolloSmart', 'vulcanSmart', 'aresSmart']:
+        model = ecobee_models.model(device_type)
+
+        if model.internal_temperature:
 
-            internalTemp = thermostat_data.get('internal').get('temperature')
+            internalTemp = (thermostat_data.get('internal') or {}).get('temperature')
             try:
-                convertedTemp = EcobeeDevice.temperatureFormatter.convertFromEcobee(internalTemp)
+                convertedTemp, convertedUi = EcobeeDevice.temperatureFormatter.reading(internalTemp)
             except (Exception,):
                 self.logger.warning(f"{device.name}: Error converting internalTemp {internalTemp}")
             else:
-                self.logger.debug(f"{device.name}: Reported internalTemp: {internalTemp}, converted internalTemp: {convertedTemp}")
-                update_list.append({'key': "temperatureInput2",
-                                    'value': convertedTemp,
-                                    'uiValue': EcobeeDevice.temperatureFormatter.format(internalTemp),
-                                    'decimalPlaces': 1})
+                self.logger.debug("%s: Reported internalTemp: %s, converted internalTemp: %s", device.name, internalTemp, convertedTemp)
+                if self.should_report("temperatureInput2", convertedTemp, self.temperatureDelta):
+                    update_list.append({'key': "temperatureInput2", 'value': convertedTemp, 'uiValue': convertedUi, 'decimalPlaces': 1})
 
+        if model.auto_away:
             latestEventType = thermostat_data.get('latestEventType')
             update_list.append({'key': "autoHome", 'value': bool(latestEventType and ('autoHome' in latestEventType))})
             update_list.append({'key': "autoAway", 'value': bool(latestEventType and ('autoAway' in latestEventType))})
 
+        upcoming = program_schedule.next_transition(thermostat_data["schedule"], thermostat_data["utcOffset"]) if "schedule" in thermostat_data else None
+        if upcoming:
+            nextClimate, when = upcoming
+            update_list.append({'key': "nextClimate", 'value': thermostat_data["climates"].get(nextClimate, nextClimate)})
+            update_list.append({'key': "nextTransitionTime", 'value': time.strftime(TRANSITION_TIME_FORMAT, time.localtime(when))})
+        else:
+            update_list.append({'key': "nextClimate", 'value': ""})
+            update_list.append({'key': "nextTransitionTime", 'value': ""})
+
+        weather = self.ecobee.weather.get(self.address)
+        if weather:
+            update_list.extend(self.weather_states(weather))
+
+        update_list.append({'key': "suppressedUpdates", 'value': self.suppressed})
+        update_list.extend(self.freshness(device, thermostat_data))
+
         device.updateStatesOnServer(update_list)
+        self.show_error_state(device)
+
+        internal = thermostat_data.get('internal') or {}
+        self.recent.append(time.time(), dispValue, hum, occupancy(internal.get('occupancy')))
+
+        # the thermostat's own sensor, for zones it's a member of.  Without one, the displayed temperature is its own.
+        ownTemp = str(internal.get('temperature')) if model.internal_temperature else str(dispTemp)
+        ownOccupancy = internal.get('occupancy')
+        indigo.activePlugin.zones.report(self.devID, int(ownTemp) if ownTemp.isdigit() else None,
+                                         ownOccupancy == 'true' if ownOccupancy is not None else None)
 
         if self.occupancy:
 
@@ -190,15 +322,24 @@ class EcobeeThermostat(EcobeeDevice):
             else:
                 self.occupancy.updateStateImageOnServer(indigo.kStateImageSel.MotionSensor)
 
+    @staticmethod
+    def weather_states(weather):
+        update_list = [
+            {'key': "weatherCondition", 'value': weather["condition"]},
+            {'key': "weatherUpdated", 'value': time.strftime(TRANSITION_TIME_FORMAT, time.localtime(weather["timestamp"]))},
+        ]
+        for key, field in (("outdoorTemperature", "temperature"), ("forecastHigh", "tempHigh"), ("forecastLow", "tempLow")):
+            if weather[field] is not None:
+                value, ui = EcobeeDevice.temperatureFormatter.reading(weather[field])
+                update_list.append({'key': key, 'value': value, 'uiValue': ui, 'decimalPlaces': 1})
+        for key, field in (("outdoorHumidity", "humidity"), ("windSpeed", "windSpeed"), ("precipitationChance", "pop")):
+            if weather[field] is not None:
+                update_list.append({'key': key, 'value': weather[field]})
+        return update_list
+
     def set_hvac_mode(self, hvac_mode):  # possible hvac modes are auto, auxHeatOnly, cool, heat, off
-        body = {
-            "selection":
-                {"selectionType": "thermostats", "selectionMatch": self.address},
-            "thermostat":
-                {"settings": {"hvacMode": hvac_mode}}
-        }
         log_msg_action = "set HVAC mode"
-        self.ecobee.make_request(body, log_msg_action)
+        return self.ecobee.make_request(hvac_mode_body(self.address, hvac_mode), log_msg_action)
 
     def set_hold_cool(self, cool_temp, hold_type="nextTransition"):
         self.logger.debug(f"{self.name}: set_hold_cool: {cool_temp}")
@@ -224,7 +365,7 @@ class EcobeeThermostat(EcobeeDevice):
                 [{"type": "setHold", "params": {"holdType": hold_type, "coolHoldTemp": eb_cool_temp, "heatHoldTemp": eb_heat_temp}}]
         }
         log_msg_action = "set hold temp"
-        self.ecobee.make_request(body, log_msg_action)
+        return self.ecobee.make_request(body, log_msg_action)
 
     def set_hold_temp_with_fan(self, cool_temp, heat_temp, hold_type="nextTransition"):  # Set a fan hold
         self.logger.debug(f"{self.name}: set_hold_temp_with_fan, cool_temp: {cool_temp}, heat_temp: {heat_temp}")
@@ -243,38 +384,21 @@ class EcobeeThermostat(EcobeeDevice):
                 }]
         }
         log_msg_action = "set hold temp with fan on"
-        self.ecobee.make_request(body, log_msg_action)
+        return self.ecobee.make_request(body, log_msg_action)
 
     def set_climate_hold(self, climate, hold_type="nextTransition"):  # Set a climate hold - ie away, home, sleep
-        body = {
-            "selection":
-                {"selectionType": "thermostats", "selectionMatch": self.address},
-            "functions":
-                [{
-                    "type": "setHold",
-                    "params": {"holdType": hold_type, "holdClimateRef": climate}
-                 }]
-        }
         log_msg_action = "set climate hold"
-        self.ecobee.make_request(body, log_msg_action)
+        return self.ecobee.make_request(climate_hold_body(self.address, climate, hold_type), log_msg_action)
 
     def resume_program(self):  # Resume currently scheduled program
-        body = {
-            "selection":
-                {"selectionType": "thermostats", "selectionMatch": self.address},
-            "functions":
-                [{
-                    "type": "resumeProgram", "params": {"resumeAll": "False"}
-                }]
-        }
         log_msg_action = "resume program"
-        self.ecobee.make_request(body, log_msg_action)
+        return self.ecobee.make_request(resume_program_body(self.address), log_msg_action)
 
 class RemoteSensor(EcobeeDevice):
 
     def update(self):
 
-        self.logger.debug(f"{self.name}: Updating device")
+        self.logger.debug("%s: Updating device", self.name)
         device = indigo.devices[self.devID]
 
         # has the Ecobee account been initialized yet?
@@ -296,11 +420,13 @@ class RemoteSensor(EcobeeDevice):
                 self.logger.info(f'not authenticated to Ecobee servers yet; not initializing state of device {self.address}')
                 return
 
-        try:
-            remote_sensor = self.ecobee.sensors[self.address]
-        except (Exception,):
+        remote_sensor = self.ecobee.sensors.get(self.address)
+        if not remote_sensor:
             self.logger.debug(f"update: no remote sensor data found for address {self.address}")
+            self.set_orphaned(device, self.ecobee.generation > 0)
+            indigo.activePlugin.zones.report(self.devID, None, None)
             return
+        self.set_orphaned(device, False)
 
         occupied = remote_sensor.get('occupancy')
         device.updateStateOnServer(key="onOffState", value=occupied)
@@ -312,9 +438,20 @@ class RemoteSensor(EcobeeDevice):
         temp = remote_sensor.get('temperature')
 
         # check for non-digit values returned when remote is not responding
+        converted, convertedUi = EcobeeDevice.temperatureFormatter.reading(temp) if temp.isdigit() else (None, None)
+        self.recent.append(time.time(), converted, number(remote_sensor.get('humidity')), occupancy(occupied))
+        indigo.activePlugin.zones.report(self.devID, int(temp) if temp.isdigit() else None, occupied == 'true')
+
         if temp.isdigit():
-            self.logger.debug(f"{device.name}: Reported temp: {temp}, converted temp: {EcobeeDevice.temperatureFormatter.convertFromEcobee(temp)}")
-            device.updateStateOnServer(key="sensorValue",
-                                       value=EcobeeDevice.temperatureFormatter.convertFromEcobee(temp),
-                                       uiValue=EcobeeDevice.temperatureFormatter.format(temp),
-                                       decimalPlaces=1)
+            self.logger.debug("%s: Reported temp: %s, converted temp: %s", device.name, temp, converted)
+            suppressed = self.suppressed
+            if self.should_report("sensorValue", converted, self.temperatureDelta):
+                device.updateStateOnServer(key="sensorValue",
+                                           value=converted,
+                                           uiValue=convertedUi,
+                                           decimalPlaces=1)
+            if self.suppressed != suppressed:
+                device.updateStateOnServer(key="suppressedUpdates", value=self.suppressed)
+
+        device.updateStatesOnServer(self.freshness(device, remote_sensor))
+        self.show_error_state(device)
@@ -0,0 +1,81 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import collections
+import functools
+
+#
+# Capabilities of each Ecobee thermostat model.  Device creation, the dynamic state list and the thermostat update all
+# work from this table, so supporting a new model is one row here.
+#
+#   internal_temperature    reports the thermostat's own temperature sensor as a second temperature input
+#   occupancy               has a built-in occupancy sensor, which gets its own OccupancySensor device
+#   remotes                 supports linked remote sensors
+#   auto_away               reports autoAway / autoHome events
+#
+
+EcobeeModel = collections.namedtuple('EcobeeModel', ['name', 'internal_temperature', 'occupancy', 'remotes', 'auto_away'])
+
+ECOBEE_MODELS = {
+    'Unknown':      EcobeeModel('Unknown Device',                       False, False, False, False),
+    'idtSmart':     EcobeeModel('ecobee Smart',                         False, False, False, False),
+    'siSmart':      EcobeeModel('ecobee Si Smart',                      False, False, False, False),
+    'athenaSmart':  EcobeeModel('ecobee3 Smart',                        True,  True,  True,  True),
+    'corSmart':     EcobeeModel('Carrier or Bryant Cor',                False, True,  False, True),
+    'nikeSmart':    EcobeeModel('ecobee3 lite Smart',                   True,  False, True,  True),
+    'apolloSmart':  EcobeeModel('ecobee4 Smart',                        True,  True,  True,  True),
+    'vulcanSmart':  EcobeeModel('ecobee Smart w/ Voice Control',        True,  True,  True,  True),
+    'aresSmart':    EcobeeModel('ecobee Smart Thermostat Premium',      True,  True,  True,  True),
+    'artemisSmart': EcobeeModel('ecobee Smart Thermostat Enhanced',     True,  True,  True,  True),
+    'attisRetail':  EcobeeModel('ecobee Smart Thermostat Essential',    False, False, False, True),
+}
+
+# Dynamic thermostat states, in display order: (key, state label, trigger label, type, capability needed).
+# Types are Indigo's state value types, 150 = string, 100 = number, 52 = boolean shown as yes/no.
+
+MODEL_STATES = [
+    ("hvacMode",        "HVAC Mode",                "HVAC Mode",        150, None),
+    ("latestEventType", "Last Event",               "Last Event",       150, None),
+    ("device_type",     "Model",                    "Model",            150, None),
+    ("climate",         "Climate",                  "Climate",          150, None),
+    ("equipmentStatus", "Status",                   "Status",           150, None),
+    ("occupied",        "Occupied (yes or no)",     "Occupied",         52,  'occupancy'),
+    ("autoAway",        "Auto-Away (yes or no)",    "Auto-Away",        52,  'auto_away'),
+    ("autoHome",        "Auto-Home (yes or no)",    "Auto-Home",        52,  'auto_away'),
+    ("fanMinOnTime",    "Minimum fan time",         "Minimum fan time", 100, None),
+]
+
+
+def model(device_type):
+    """Capabilities for a modelNumber, models not in the table are treated as Unknown."""
+    return ECOBEE_MODELS.get(device_type, ECOBEE_MODELS['Unknown'])
+
+
+@functools.lru_cache(maxsize=None)
+def _model_states(device_type):
+    if device_type not in ECOBEE_MODELS or device_type == 'Unknown':
+        return ()
+    capabilities = model(device_type)
+    return tuple(
+        {"Disabled": False, "Key": key, "StateLabel": label, "TriggerLabel": trigger, "Type": state_type}
+        for key, label, trigger, state_type, needs in MODEL_STATES
+        if needs is None or getattr(capabilities, needs)
+    )
+
+
+def state_list(device_type):
+    """The dynamic states for a model, worked out once per model.  Each call returns its own copies of the state
+    dicts, so a device's state list never shares them with another device's.  Unknown models have none."""
+    return [dict(state) for state in _model_states(device_type)]
+
+
+def thermostat_props(device_type):
+    """Model dependent pluginProps for a new EcobeeThermostat device."""
+    props = {
+        "device_type": device_type,
+        "NumHumidityInputs": 1,
+        "ShowCoolHeatEquipmentStateUI": True,
+    }
+    if model(device_type).internal_temperature:
+        props["NumTemperatureInputs"] = 2
+    return props
@@ -0,0 +1,172 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import collections
+import gzip
+import json
+import logging
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+
+#
+# HTTP transports used by EcobeeAccount.  LiveTransport talks to the Ecobee servers, RecordingTransport does the same
+# and also writes every exchange to a gzipped JSON lines cassette, and ReplayTransport answers from a cassette instead
+# of the network.  OfflineTransport fails every request, for when a replay was asked for but its cassette can't be
+# read.  Tokens and auth codes are redacted before anything is written.
+#
+
+REDACTED = "REDACTED"
+REDACT_KEYS = ('access_token', 'refresh_token', 'ecobeePin')
+AUTH_CODE_PATHS = ('/authorize', '/token')    # 'code' is the auth code here, but a status code everywhere else
+
+
+def redact(data, keys=REDACT_KEYS):
+    if isinstance(data, dict):
+        return {k: (REDACTED if k in keys else redact(v, keys)) for k, v in data.items()}
+    if isinstance(data, list):
+        return [redact(v, keys) for v in data]
+    return data
+
+
+class LiveTransport:
+
+    def __init__(self):
+        self.logger = logging.getLogger("Plugin.EcobeeTransport")
+
+    def request(self, method, url, **kwargs):
+        return requests.request(method, url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def close(self):
+        pass
+
+
+class OfflineTransport(LiveTransport):
+
+    def __init__(self, reason):
+        super(OfflineTransport, self).__init__()
+        self.reason = reason
+
+    def request(self, method, url, **kwargs):
+        raise requests.ConnectionError(f"No Ecobee API access, {self.reason}")
+
+
+class RecordingTransport(LiveTransport):
+
+    def __init__(self, path):
+        super(RecordingTransport, self).__init__()
+        self.path = path
+        self.lock = threading.Lock()
+        self.file = gzip.open(path, "at", encoding="utf-8")
+        self.logger.info(f"Recording Ecobee API traffic to {path}")
+
+    def request(self, method, url, **kwargs):
+        path = urlparse(url).path
+        keys = REDACT_KEYS + ('code',) if path in AUTH_CODE_PATHS else REDACT_KEYS
+        entry = {
+            "time": time.time(),
+            "method": method,
+            "path": path,
+            "params": redact(kwargs.get("params"), keys),
+            "body": redact(kwargs.get("json"), keys),
+        }
+
+        start = time.perf_counter()
+        try:
+            response = super(RecordingTransport, self).request(method, url, **kwargs)
+        except requests.RequestException as e:
+            entry["latency"] = time.perf_counter() - start
+            entry["error"] = str(e)
+            self.write(entry)
+            raise
+
+        entry["latency"] = time.perf_counter() - start
+        entry["status"] = response.status_code
+        entry["headers"] = {"Content-Type": response.headers.get("Content-Type", "")}
+        try:
+            entry["response"] = redact(response.json(), keys)
+        except ValueError:
+            entry["text"] = response.text
+        self.write(entry)
+        return response
+
+    def write(self, entry):
+        with self.lock:
+            if self.file.closed:        # replaced while this request was in flight
+                return
+            self.file.write(json.dumps(entry, separators=(',', ':')) + "\n")
+            self.file.flush()
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+
+class CassetteResponse:
+
+    def __init__(self, entry):
+        self.status_code = entry.get("status", 200)
+        self.headers = entry.get("headers", {})
+        self._json = entry.get("response")
+        self.text = entry["text"] if "text" in entry else json.dumps(self._json)
+        self.content = self.text.encode("utf-8")
+        self.ok = self.status_code < 400
+
+    def json(self):
+        if self._json is None:
+            return json.loads(self.text)
+        return self._json
+
+    def __repr__(self):
+        return f"<CassetteResponse [{self.status_code}]>"
+
+
+class ReplayTransport(LiveTransport):
+
+    # Exchanges are replayed in recorded order for each (method, path), so a replay is deterministic no matter how the
+    # different endpoints interleave.  With realtime set, each reply is delayed by its recorded latency.
+
+    def __init__(self, path, realtime=True, loop=False):
+        super(ReplayTransport, self).__init__()
+        self.path = path
+        self.realtime = realtime
+        self.loop = loop
+        self.lock = threading.Lock()
+        self.recorded = collections.defaultdict(list)
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self.recorded[(entry["method"], entry["path"])].append(entry)
+        self.queues = {key: collections.deque(entries) for key, entries in self.recorded.items()}
+        self.logger.info(f"Replaying Ecobee API traffic from {path}, {sum(len(e) for e in self.recorded.values())} exchanges")
+
+    def request(self, method, url, **kwargs):
+        key = (method, urlparse(url).path)
+        with self.lock:
+            queue = self.queues.get(key)
+            if not queue and self.loop and self.recorded.get(key):
+                queue = self.queues[key] = collections.deque(self.recorded[key])
+            if not queue:
+                raise requests.ConnectionError(f"No recorded response left for {method} {key[1]}")
+            entry = queue.popleft()
+
+        if self.realtime:
+            time.sleep(entry.get("latency", 0.0))
+        if "error" in entry:
+            raise requests.ConnectionError(entry["error"])
+
+        # hand the caller's own refresh token back, so replaying never replaces a real token with the redacted one
+        refresh_token = (kwargs.get("params") or {}).get("refresh_token")
+        if refresh_token and isinstance(entry.get("response"), dict) and "refresh_token" in entry["response"]:
+            entry = dict(entry, response=dict(entry["response"], refresh_token=refresh_token))
+
+        return CassetteResponse(entry)
@@ -0,0 +1,180 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import csv
+import logging
+import sqlite3
+import threading
+import time
+
+#
+# Optional on-disk history of thermostat and sensor readings.  Temperatures are stored as the raw Ecobee values
+# (F x 10) so the history doesn't depend on the temperature scale selected in the plugin config.  Rows are keyed by
+# account and address, since two account devices on the same Ecobee login both record the same thermostats.
+#
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS thermostat_history (
+    account INTEGER NOT NULL,
+    address TEXT NOT NULL,
+    ts REAL NOT NULL,
+    temperature INTEGER,
+    humidity INTEGER,
+    desired_heat INTEGER,
+    desired_cool INTEGER,
+    internal_temperature INTEGER,
+    occupied INTEGER,
+    hvac_mode TEXT,
+    climate TEXT,
+    equipment_status TEXT
+);
+DROP INDEX IF EXISTS thermostat_history_device_ts;
+CREATE INDEX IF NOT EXISTS thermostat_history_account_device_ts ON thermostat_history (account, address, ts);
+
+CREATE TABLE IF NOT EXISTS sensor_history (
+    account INTEGER NOT NULL,
+    address TEXT NOT NULL,
+    ts REAL NOT NULL,
+    temperature INTEGER,
+    occupied INTEGER
+);
+DROP INDEX IF EXISTS sensor_history_device_ts;
+CREATE INDEX IF NOT EXISTS sensor_history_account_device_ts ON sensor_history (account, address, ts);
+"""
+
+TABLES = {
+    'thermostat': 'thermostat_history',
+    'sensor': 'sensor_history',
+}
+
+TEMPERATURE_COLUMNS = ('temperature', 'desired_heat', 'desired_cool', 'internal_temperature')
+
+PRUNE_INTERVAL = 3600.0     # seconds between retention/downsampling passes
+DOWNSAMPLE_BUCKET = 3600    # rows older than the downsample age are thinned to one per device per bucket
+
+
+def _int_or_none(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _occupied(value):
+    if value is None:
+        return None
+    return 1 if value in (True, 'true', '1', 1) else 0
+
+
+class HistoryStore:
+
+    def __init__(self, path, retention_days=90, downsample_days=7):
+        self.logger = logging.getLogger("Plugin.HistoryStore")
+        self.path = path
+        self.retention_days = retention_days
+        self.downsample_days = downsample_days
+        self.next_prune = time.time()
+        self.lock = threading.Lock()
+
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+        self.logger.debug(f"HistoryStore opened {path}, retention = {retention_days} days, downsample after {downsample_days} days")
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    # Record one poll cycle for an account.  Everything goes in a single transaction.
+
+    def record(self, account_id, thermostats, sensors, timestamp=None):
+        ts = timestamp or time.time()
+
+        stat_rows = []
+        for address, therm in thermostats.items():
+            internal = therm.get("internal") or {}
+            stat_rows.append((account_id, address, ts,
+                              _int_or_none(therm.get("actualTemperature")),
+                              _int_or_none(therm.get("actualHumidity")),
+                              _int_or_none(therm.get("desiredHeat")),
+                              _int_or_none(therm.get("desiredCool")),
+                              _int_or_none(internal.get("temperature")),
+                              _occupied(internal.get("occupancy")),
+                              therm.get("hvacMode"),
+                              therm.get("currentClimate"),
+                              therm.get("equipmentStatus")))
+
+        sensor_rows = [
+            (account_id, address, ts, _int_or_none(sensor.get("temperature")), _occupied(sensor.get("occupancy")))
+            for address, sensor in sensors.items()
+        ]
+
+        with self.lock:
+            try:
+                with self.conn:
+                    self.conn.executemany("INSERT INTO thermostat_history VALUES (?,?,?,?,?,?,?,?,?,?,?,?)", stat_rows)
+                    self.conn.executemany("INSERT INTO sensor_history VALUES (?,?,?,?,?)", sensor_rows)
+            except sqlite3.Error as e:
+                self.logger.warning(f"HistoryStore insert failed: {e}")
+                return
+
+        self.logger.debug(f"HistoryStore recorded {len(stat_rows)} thermostats and {len(sensor_rows)} sensors for account {account_id}")
+
+        if time.time() > self.next_prune:
+            self.prune()
+
+    # Drop rows past the retention age, and thin out rows past the downsample age to one per device per hour.
+
+    def prune(self, now=None):
+        now = now or time.time()
+        self.next_prune = now + PRUNE_INTERVAL
+
+        with self.lock:
+            try:
+                with self.conn:
+                    for table in TABLES.values():
+                        if self.retention_days > 0:
+                            self.conn.execute(f"DELETE FROM {table} WHERE ts < ?", (now - self.retention_days * 86400,))
+                        if self.downsample_days > 0:
+                            cutoff = now - self.downsample_days * 86400
+                            self.conn.execute(f"DELETE FROM {table} WHERE ts < ? AND rowid NOT IN "
+                                              f"(SELECT MIN(rowid) FROM {table} WHERE ts < ? "
+                                              f"GROUP BY account, address, CAST(ts / {DOWNSAMPLE_BUCKET} AS INTEGER))",
+                                              (cutoff, cutoff))
+            except sqlite3.Error as e:
+                self.logger.warning(f"HistoryStore prune failed: {e}")
+
+    def select(self, kind, addresses=None, start=None, end=None, account=None):
+        """The column names and row tuples for a query, the columns even when no rows match."""
+        table = TABLES[kind]
+        sql = f"SELECT * FROM {table} WHERE ts >= ? AND ts <= ?"
+        args = [start or 0.0, end or time.time()]
+        if account:
+            sql += " AND account = ?"
+            args.append(account)
+        if addresses:
+            sql += f" AND address IN ({','.join('?' * len(addresses))})"
+            args.extend(addresses)
+        sql += " ORDER BY account, address, ts"
+
+        with self.lock:
+            cursor = self.conn.execute(sql, args)
+            return [c[0] for c in cursor.description], cursor.fetchall()
+
+    def query(self, kind, addresses=None, start=None, end=None, account=None):
+        columns, rows = self.select(kind, addresses, start, end, account)
+        return [dict(zip(columns, row)) for row in rows]
+
+    def export_csv(self, path, kind, formatter, addresses=None, start=None, end=None, account=None):
+        columns, rows = self.select(kind, addresses, start, end, account)
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=columns + ["time"])
+            writer.writeheader()
+            for row in rows:
+                row = dict(zip(columns, row))
+                row["time"] = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(row["ts"]))
+                for key in TEMPERATURE_COLUMNS:
+                    if row.get(key) is not None:
+                        row[key] = round(formatter.reading(row[key])[0], 1)
+                writer.writerow(row)
+        return len(rows)
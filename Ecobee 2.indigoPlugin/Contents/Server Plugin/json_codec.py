@@ -0,0 +1,23 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#
+# JSON decoding for Ecobee API responses.  orjson is used when it's installed, it decodes large thermostatList payloads
+# several times faster than the standard library.  Both take the raw response bytes and raise a ValueError subclass
+# on bad input.
+#
+
+try:
+    from orjson import loads
+    DECODER = "orjson"
+except ImportError:
+    from json import loads
+    DECODER = "json"
+
+
+def decode(response):
+    """Decode the body of an API response, or None if it isn't JSON."""
+    try:
+        return loads(response.content)
+    except ValueError:
+        return None
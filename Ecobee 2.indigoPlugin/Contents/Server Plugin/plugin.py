@@ -3,31 +3,32 @@
 
 import json
 import logging
+import os
 import platform
 import threading
 import time
 
-from ecobee_account import EcobeeAccount
-from ecobee_devices import EcobeeDevice, EcobeeThermostat, RemoteSensor
-
+from change_events import BROADCAST_MESSAGE, ChangeTracker
+from cycle_profiler import CycleProfiler, profiled_action
+from device_index import DeviceIndex, account_id
+from ecobee_account import COMMAND_FAILED, EcobeeAccount
+from ecobee_devices import EcobeeDevice, EcobeeThermostat, RemoteSensor, climate_hold_body, hvac_mode_body, resume_program_body
+from ecobee_transport import LiveTransport, OfflineTransport, RecordingTransport, ReplayTransport
+from history_store import HistoryStore
+from status_server import StatusServer
+from token_store import TOKEN_FILE, TokenStore
+from tracing import tracer
+from zone_aggregate import ZoneAggregates
+
+import ecobee_models
 import temperature_scale
 
-REFRESH_TOKEN_PLUGIN_PREF = 'refreshToken-{}'
+REFRESH_TOKEN_PLUGIN_PREF = 'refreshToken-{}'     # where earlier versions saved the tokens, moved to the token store
 TEMPERATURE_SCALE_PLUGIN_PREF = 'temperatureScale'
-
-ECOBEE_MODELS = {
-    'Unknown': 'Unknown Device',
-    'idtSmart': 'ecobee Smart',
-    'siSmart': 'ecobee Si Smart',
-    'athenaSmart': 'ecobee3 Smart',
-    'corSmart': 'Carrier or Bryant Cor',
-    'nikeSmart': 'ecobee3 lite Smart',
-    'apolloSmart': 'ecobee4 Smart',
-    'vulcanSmart': 'ecobee Smart w/ Voice Control',
-    'aresSmart': 'ecobee Smart Thermostat Premium',
-    'artemisSmart': 'ecobee Smart Thermostat Enhanced',
-    'attisRetail': 'ecobee Smart Thermostat Essential',
-}
+HISTORY_DATABASE_FILE = 'history.sqlite'
+CASSETTE_FILE = 'cassette.jsonl.gz'
+HISTORY_TIME_FORMAT = '%Y-%m-%d %H:%M'
+TRANSITION_REFRESH_DELAY = 120.0    # seconds after a scheduled climate change before fetching, so Ecobee has reported it
 
 TEMP_CONVERTERS = {
     'F': temperature_scale.Fahrenheit(),
@@ -58,12 +59,20 @@ class Plugin(indigo.PluginBase):
         self.logLevel = int(self.pluginPrefs.get("logLevel", logging.INFO))
         self.indigo_log_handler.setLevel(self.logLevel)
         self.plugin_file_handler.setLevel(self.logLevel)
+        self.logger.setLevel(self.logLevel)     # so disabled debug logging is skipped before any formatting
         self.logger.debug(f"logLevel = {self.logLevel}")
 
         self.ecobee_accounts = {}
         self.ecobee_thermostats = {}
         self.ecobee_remotes = {}
+        self.device_index = DeviceIndex()
+        self.unassigned = set()        # devices already warned about for not being under a running account
+        self.zones = ZoneAggregates()
+        self.shared_accounts = {}      # account device id -> id of the account whose snapshot it uses
+        self.transitions = {}          # account device id -> time of the next scheduled climate change on its thermostats
         self.temp_ecobeeAccount = None
+        self.change_tracker = ChangeTracker()
+        self.broadcast_changes = bool(self.pluginPrefs.get('broadcastChanges', False))
 
         self.update_needed = False
 
@@ -74,12 +83,145 @@ class Plugin(indigo.PluginBase):
         scale = self.pluginPrefs.get(TEMPERATURE_SCALE_PLUGIN_PREF, 'F')
         self.logger.debug(f'setting temperature scale to {scale}')
         EcobeeDevice.temperatureFormatter = TEMP_CONVERTERS[scale]
+        EcobeeDevice.recentCapacity = int(self.pluginPrefs.get('recentBufferSize', "288"))
+        EcobeeDevice.staleAfter = float(self.pluginPrefs.get('staleAfter', "45")) * 60.0
+        EcobeeAccount.change_detection = bool(self.pluginPrefs.get('changeDetection', False))
+        EcobeeAccount.command_ttl = float(self.pluginPrefs.get('commandTTL', "30")) * 60.0
+        EcobeeAccount.include_weather = bool(self.pluginPrefs.get('includeWeather', False))
+        EcobeeAccount.weather_ttl = float(self.pluginPrefs.get('weatherRefresh', "60")) * 60.0
+
+        self.data_folder = f"{indigo.server.getInstallFolderPath()}/Preferences/Plugins/{self.pluginId}"
+        os.makedirs(self.data_folder, exist_ok=True)
+        EcobeeAccount.journal_folder = self.data_folder
+        self.tokens = TokenStore(os.path.join(self.data_folder, TOKEN_FILE))
+        if self.tokens.migrate(self.pluginPrefs, REFRESH_TOKEN_PLUGIN_PREF):
+            self.logger.info(f"Moved saved refresh tokens from the plugin prefs to {TOKEN_FILE}")
+        self.profiler = CycleProfiler(self.data_folder)
+
+        self.history = None
+        self.configure_history(self.pluginPrefs)
+        self.transport_settings = None
+        self.configure_transport(self.pluginPrefs)
+        self.status_server = None
+        self.status_settings = None
+        self.configure_status_server(self.pluginPrefs)
+
+    def shutdown(self):
+        self.logger.debug("shutdown")
+        self.tokens.flush()
+        if self.history:
+            self.history.close()
+            self.history = None
+        EcobeeAccount.transport.close()
+        if self.status_server:
+            self.status_server.close()
+            self.status_server = None
+
+    def configure_history(self, prefs):
+        if self.history:
+            self.history.close()
+            self.history = None
+
+        if not prefs.get('historyEnabled', False):
+            self.logger.debug("History store disabled")
+            return
+
+        path = os.path.join(self.data_folder, HISTORY_DATABASE_FILE)
+        try:
+            self.history = HistoryStore(path, retention_days=int(prefs.get('historyRetention', "90")),
+                                        downsample_days=int(prefs.get('historyDownsample', "7")))
+        except Exception as e:
+            self.logger.error(f"Unable to open history store {path}: {e}")
+
+    # Selects how EcobeeAccount reaches the Ecobee API: live, live while recording a cassette, or replaying a cassette
+
+    def configure_transport(self, prefs):
+        mode = prefs.get('transportMode', 'live')
+        path = prefs.get('cassetteFile', '') or os.path.join(self.data_folder, CASSETTE_FILE)
+        settings = (mode, path, bool(prefs.get('cassetteRealtime', True)))
+        if settings == getattr(self, 'transport_settings', None):
+            return
+        self.transport_settings = settings
+
+        # install the new transport before closing the old one, the poll thread may still be using it.  A recorder is
+        # closed first when the new transport opens its cassette, so the file is complete before it is read again.
+        previous = EcobeeAccount.transport
+        if isinstance(previous, RecordingTransport) and previous.path == path:
+            previous.close()
+        try:
+            if mode == 'record':
+                EcobeeAccount.transport = RecordingTransport(path)
+            elif mode == 'replay':
+                EcobeeAccount.transport = ReplayTransport(path, realtime=settings[2])
+            else:
+                EcobeeAccount.transport = LiveTransport()
+        except Exception as e:
+            if mode == 'replay':        # replay means no network, don't fall back to the live API
+                self.logger.error(f"Unable to replay API cassette {path}: {e}, Ecobee API calls will fail")
+                EcobeeAccount.transport = OfflineTransport(f"unable to replay {path}")
+            else:
+                self.logger.error(f"Unable to use API cassette {path}: {e}, using live API")
+                EcobeeAccount.transport = LiveTransport()
+        previous.close()
+
+    def configure_status_server(self, prefs):
+        enabled = bool(prefs.get('statusServerEnabled', False))
+        settings = (enabled, prefs.get('statusServerHost', "127.0.0.1"), int(prefs.get('statusServerPort', "8178")))
+        if settings == self.status_settings:
+            return
+        self.status_settings = settings
+
+        if self.status_server:
+            self.status_server.close()
+            self.status_server = None
+        if enabled:
+            try:
+                self.status_server = StatusServer(settings[1], settings[2])
+            except OSError as e:
+                self.logger.error(f"Unable to start status server on {settings[1]}:{settings[2]}: {e}")
+                return
+            self.publish_status()
+
+    def publish_status(self):
+        if self.status_server:
+            self.status_server.publish({accountID: account.status() for accountID, account in self.ecobee_accounts.items()})
 
     def validatePrefsConfigUi(self, valuesDict):    # noqa
         errorDict = indigo.Dict()
         updateFrequency = int(valuesDict['updateFrequency'])
         if (updateFrequency < 3) or (updateFrequency > 60):
             errorDict['updateFrequency'] = "Update frequency is invalid - enter a valid number (between 3 and 60)"
+        for key in ['historyRetention', 'historyDownsample']:
+            try:
+                if int(valuesDict.get(key, "0")) < 0:
+                    raise ValueError
+            except ValueError:
+                errorDict[key] = "Enter a number of days (0 to disable)"
+        try:
+            if int(valuesDict.get('recentBufferSize', "288")) < 2:
+                raise ValueError
+        except ValueError:
+            errorDict['recentBufferSize'] = "Enter a number of readings (at least 2)"
+        try:
+            if float(valuesDict.get('staleAfter', "45")) <= 0:
+                raise ValueError
+        except ValueError:
+            errorDict['staleAfter'] = "Enter a number of minutes (more than 0)"
+        try:
+            if float(valuesDict.get('commandTTL', "30")) <= 0:
+                raise ValueError
+        except ValueError:
+            errorDict['commandTTL'] = "Enter a number of minutes (more than 0)"
+        try:
+            if float(valuesDict.get('weatherRefresh', "60")) < 15:
+                raise ValueError
+        except ValueError:
+            errorDict['weatherRefresh'] = "Enter a number of minutes (at least 15)"
+        try:
+            if not 0 < int(valuesDict.get('statusServerPort', "8178")) < 65536:
+                raise ValueError
+        except ValueError:
+            errorDict['statusServerPort'] = "Enter a TCP port number (1 to 65535)"
         if len(errorDict) > 0:
             return False, valuesDict, errorDict
         return True
@@ -89,6 +231,7 @@ class Plugin(indigo.PluginBase):
             self.logLevel = int(valuesDict.get("logLevel", logging.INFO))
             self.indigo_log_handler.setLevel(self.logLevel)
             self.plugin_file_handler.setLevel(self.logLevel)
+            self.logger.setLevel(self.logLevel)
             self.logger.debug(f"logLevel = {str(self.logLevel)}")
 
             self.updateFrequency = float(valuesDict['updateFrequency']) * 60.0
@@ -97,7 +240,23 @@ class Plugin(indigo.PluginBase):
 
             scale = valuesDict[TEMPERATURE_SCALE_PLUGIN_PREF]
             self.logger.debug(f'setting temperature scale to {scale}')
+            if EcobeeDevice.temperatureFormatter is not TEMP_CONVERTERS[scale]:
+                for device in list(self.ecobee_thermostats.values()) + list(self.ecobee_remotes.values()):
+                    device.recent.clear()
+                TEMP_CONVERTERS[scale].build_table()
+                self.zones.invalidate()
             EcobeeDevice.temperatureFormatter = TEMP_CONVERTERS[scale]
+            EcobeeDevice.recentCapacity = int(valuesDict.get('recentBufferSize', "288"))
+            EcobeeDevice.staleAfter = float(valuesDict.get('staleAfter', "45")) * 60.0
+            EcobeeAccount.change_detection = bool(valuesDict.get('changeDetection', False))
+            EcobeeAccount.command_ttl = float(valuesDict.get('commandTTL', "30")) * 60.0
+            EcobeeAccount.include_weather = bool(valuesDict.get('includeWeather', False))
+            EcobeeAccount.weather_ttl = float(valuesDict.get('weatherRefresh', "60")) * 60.0
+            self.broadcast_changes = bool(valuesDict.get('broadcastChanges', False))
+
+            self.configure_history(valuesDict)
+            self.configure_transport(valuesDict)
+            self.configure_status_server(valuesDict)
 
             self.update_needed = True
 
@@ -110,13 +269,12 @@ class Plugin(indigo.PluginBase):
 
         if dev.deviceTypeId == 'EcobeeAccount':  # create the Ecobee account object.  It will attempt to refresh the auth token.
 
-            ecobeeAccount = EcobeeAccount(dev, refresh_token=self.pluginPrefs.get(REFRESH_TOKEN_PLUGIN_PREF.format(dev.id), None))
+            ecobeeAccount = EcobeeAccount(dev, refresh_token=self.tokens.get(dev.id))
             self.ecobee_accounts[dev.id] = ecobeeAccount
 
             dev.updateStateOnServer(key="authenticated", value=ecobeeAccount.authenticated)
             if ecobeeAccount.authenticated:
-                self.pluginPrefs[REFRESH_TOKEN_PLUGIN_PREF.format(dev.id)] = ecobeeAccount.refresh_token
-                self.savePluginPrefs()
+                self.tokens.set(dev.id, ecobeeAccount.refresh_token)
 
             self.update_needed = True
 
@@ -137,12 +295,24 @@ class Plugin(indigo.PluginBase):
                 indigo.rawServerCommand("ReplaceDevice", {"ID": dev.id, "Device": rawDev})
                 self.logger.debug(f"{dev.name}: Removed remote sensor from device group")
 
+        elif dev.deviceTypeId == 'ZoneAggregate':
+
+            self.zones.add(dev)
+            self.update_needed = True
+
+        self.device_index.add(dev)      # only once the device object exists, the poll thread updates what's indexed
+        self.unassigned.discard(dev.id)
+
     def deviceStopComm(self, dev):
         self.logger.info(f"{dev.name}: Stopping {dev.deviceTypeId} Device {dev.id}")
+        self.device_index.remove(dev.id)
+        self.unassigned.discard(dev.id)
 
         if dev.deviceTypeId == 'EcobeeAccount':
             if dev.id in self.ecobee_accounts:
                 del self.ecobee_accounts[dev.id]
+            self.change_tracker.forget(dev.id)
+            self.transitions.pop(dev.id, None)
 
         elif dev.deviceTypeId == 'EcobeeThermostat':
             if dev.id in self.ecobee_thermostats:
@@ -152,6 +322,18 @@ class Plugin(indigo.PluginBase):
             if dev.id in self.ecobee_remotes:
                 del self.ecobee_remotes[dev.id]
 
+        elif dev.deviceTypeId == 'ZoneAggregate':
+            self.zones.remove(dev.id)
+
+    def deviceUpdated(self, origDev, newDev):
+        indigo.PluginBase.deviceUpdated(self, origDev, newDev)
+
+        # keep the device index current when the address or account of a running device is changed
+        if newDev.pluginId == self.pluginId and newDev.id in self.device_index:
+            if origDev.address != newDev.address or origDev.pluginProps.get("account") != newDev.pluginProps.get("account"):
+                self.device_index.add(newDev)
+                self.unassigned.discard(newDev.id)
+
     ########################################
 
     def runConcurrentThread(self):
@@ -160,26 +342,20 @@ class Plugin(indigo.PluginBase):
             while True:
 
                 if (time.time() > self.next_update) or self.update_needed:
+                    force = self.update_needed      # requested updates skip the change detection check
                     self.update_needed = False
                     self.next_update = time.time() + self.updateFrequency
 
-                    # update from Ecobee servers
-
-                    for accountID, account in self.ecobee_accounts.items():
-                        if account.authenticated:
-                            account.server_update()
-                            indigo.devices[accountID].updateStateImageOnServer(indigo.kStateImageSel.SensorOn)
-                        else:
-                            indigo.devices[accountID].updateStateImageOnServer(indigo.kStateImageSel.SensorTripped)
-                            self.logger.debug(f"Ecobee account {accountID} not authenticated, skipping update")
-
-                    # now update all the Indigo devices         
+                    with self.profiler.cycle():
+                        self.update_all(force)
 
-                    for stat in self.ecobee_thermostats.values():
-                        stat.update()
+                # Fetch again just after a scheduled climate change, for the accounts it happens on
 
-                    for remote in self.ecobee_remotes.values():
-                        remote.update()
+                due = [accountID for accountID, when in self.transitions.items() if when and time.time() > when + TRANSITION_REFRESH_DELAY]
+                if due:
+                    self.logger.debug(f"Scheduled climate change, updating accounts {due}")
+                    with self.profiler.cycle():
+                        self.update_all(force=True, accounts=due)
 
                 # Refresh the auth tokens as needed.  Refresh interval for each account is calculated during the refresh
 
@@ -187,14 +363,106 @@ class Plugin(indigo.PluginBase):
                     if time.time() > account.next_refresh:
                         account.do_token_refresh()
                         if account.authenticated:
-                            self.pluginPrefs[REFRESH_TOKEN_PLUGIN_PREF.format(accountID)] = account.refresh_token
-                            self.savePluginPrefs()
+                            self.tokens.set(accountID, account.refresh_token)
 
                 self.sleep(1.0)
 
         except self.StopThread:
             pass
 
+    # update from Ecobee servers, then update the Indigo devices for each account
+
+    def update_all(self, force=False, accounts=None):
+        with tracer.span("poll", accounts=len(accounts or self.ecobee_accounts), force=force):
+            for accountID, account in sorted(self.ecobee_accounts.items()):     # accounts sharing a snapshot come after its owner
+                if accounts is not None and accountID not in accounts:
+                    continue
+                if account.authenticated:
+                    account.replay_commands()   # send anything queued during an outage before fetching the new state
+                    primary = self.ecobee_accounts.get(self.shared_accounts.get(accountID))
+                    if primary and primary.authenticated and primary.identifiers == account.identifiers:
+                        account.share_snapshot(primary)
+                    elif account.server_update(force) and self.history:
+                        self.history.record(accountID, account.thermostats, account.sensors)
+                    if not account.shared_with and account.weather_due():
+                        account.weather_update()
+                    account.publish_metrics()
+                    if self.broadcast_changes and not account.shared_with:     # a sharing account's changes go out with its owner's
+                        self.broadcast(accountID, account)
+                    indigo.devices[accountID].updateStateImageOnServer(indigo.kStateImageSel.SensorOn)
+                else:
+                    indigo.devices[accountID].updateStateImageOnServer(indigo.kStateImageSel.SensorTripped)
+                    self.logger.debug(f"Ecobee account {accountID} not authenticated, skipping update")
+
+                # now update the Indigo devices for this account
+
+                with tracer.span("fanout", account=accountID) as span:
+                    thermostats = self.device_index.devices(accountID, 'EcobeeThermostat')
+                    for devId in thermostats:
+                        thermostat = self.ecobee_thermostats.get(devId)
+                        if thermostat:
+                            thermostat.update()
+
+                    remotes = self.device_index.devices(accountID, 'RemoteSensor')
+                    for devId in remotes:
+                        remote = self.ecobee_remotes.get(devId)
+                        if remote:
+                            remote.update()
+                    span.set(thermostats=len(thermostats), remotes=len(remotes))
+
+                # counted from a little while ago, so a change that just happened still gets its refresh
+                self.transitions[accountID] = account.next_transition(time.time() - TRANSITION_REFRESH_DELAY)
+
+            if accounts is None:
+                self.warn_unassigned()
+            self.zones.publish(EcobeeDevice.temperatureFormatter)
+            self.find_shared_accounts()
+            self.publish_status()
+
+    # The fan-out above only reaches devices indexed under a running account.  Each device is warned about once, again
+    # only after it has been re-indexed or its account has been running in between.
+
+    def warn_unassigned(self):
+        for devId in list(self.ecobee_thermostats) + list(self.ecobee_remotes):
+            accountID = self.device_index.account_of(devId)
+            if accountID in self.ecobee_accounts:
+                self.unassigned.discard(devId)
+            elif devId not in self.unassigned:
+                self.unassigned.add(devId)
+                self.logger.warning(f"{indigo.devices[devId].name}: Ecobee account {accountID} is not running, device not updated")
+
+    def broadcast(self, accountID, account):
+        message = self.change_tracker.changes(accountID, account.thermostats, account.sensors)
+        if message:
+            self.logger.debug(f"{indigo.devices[accountID].name}: broadcasting {len(message['changes'])} changes, {len(message['removed'])} removals")
+            indigo.server.broadcastToSubscribers(BROADCAST_MESSAGE, message)
+
+    # Account devices authorized against the same Ecobee login (usually left over from a re-authorization) see the same
+    # thermostats.  The lowest numbered one keeps polling and the others share its snapshot.  An account goes back to
+    # polling on its own when the thermostats it saw in its last fetch no longer match.
+
+    def find_shared_accounts(self):
+        owners = {}
+        shared = {}
+        for accountID, account in sorted(self.ecobee_accounts.items()):
+            if not account.authenticated or not account.identifiers:
+                continue
+            owner = owners.setdefault(account.identifiers, accountID)
+            if owner != accountID:
+                shared[accountID] = owner
+
+        for accountID in set(shared) | set(self.shared_accounts):
+            if shared.get(accountID) == self.shared_accounts.get(accountID) or accountID not in self.ecobee_accounts:
+                continue
+            owner = shared.get(accountID)
+            if owner:
+                self.logger.info(f"{indigo.devices[accountID].name}: Same Ecobee thermostats as {indigo.devices[owner].name}, sharing its updates")
+                indigo.devices[accountID].updateStateOnServer("sharedWith", owner, uiValue=indigo.devices[owner].name)
+            else:
+                self.logger.info(f"{indigo.devices[accountID].name}: No longer sharing updates, polling Ecobee directly")
+                indigo.devices[accountID].updateStateOnServer("sharedWith", 0, uiValue="none")
+        self.shared_accounts = shared
+
     ########################################
     # callbacks from device creation UI
     ########################################
@@ -208,6 +476,13 @@ class Plugin(indigo.PluginBase):
         self.logger.debug(f"get_account_list: accounts = {accounts}")
         return accounts
 
+    def get_zone_member_list(self, filter="", valuesDict=None, typeId="", targetId=0):
+        members = [
+            (str(devId), indigo.devices[devId].name)
+            for devId in list(self.ecobee_thermostats) + list(self.ecobee_remotes)
+        ]
+        return sorted(members, key=lambda member: member[1].lower())
+
     def get_device_list(self, filter="", valuesDict=None, typeId="", targetId=0):
         self.logger.threaddebug(f"get_device_list: typeId = {typeId}, targetId = {targetId}, filter = {filter}, valuesDict = {valuesDict}")
 
@@ -226,10 +501,7 @@ class Plugin(indigo.PluginBase):
 
         if typeId == "EcobeeThermostat":
 
-            active_stats = [
-                (indigo.devices[dev].pluginProps["address"])
-                for dev in self.ecobee_thermostats
-            ]
+            active_stats = self.device_index.active_addresses('EcobeeThermostat')
             self.logger.debug(f"get_device_list: active_stats = {active_stats}")
 
             available_devices = []
@@ -239,10 +511,7 @@ class Plugin(indigo.PluginBase):
 
         elif typeId == "RemoteSensor":
 
-            active_sensors = [
-                (indigo.devices[dev].pluginProps["address"])
-                for dev in self.ecobee_remotes
-            ]
+            active_sensors = self.device_index.active_addresses('RemoteSensor')
             self.logger.debug("get_device_list: active_sensors = {}".format(active_sensors))
 
             available_devices = []
@@ -272,6 +541,23 @@ class Plugin(indigo.PluginBase):
     def menuChanged(self, valuesDict=None, typeId=None, devId=None):    # noqa
         return valuesDict
 
+    def validateDeviceConfigUi(self, valuesDict, typeId, devId):
+        self.logger.threaddebug(f"validateDeviceConfigUi: typeId = {typeId}, devId = {devId}, valuesDict = {valuesDict}")
+        errorsDict = indigo.Dict()
+
+        for key in ['reportTempDelta', 'reportHumidityDelta', 'reportMaxAge']:
+            if key not in valuesDict:
+                continue
+            try:
+                if float(valuesDict[key] or "0") < 0.0:
+                    raise ValueError
+            except ValueError:
+                errorsDict[key] = "Enter a number (0 or more)"
+
+        if len(errorsDict) > 0:
+            return False, valuesDict, errorsDict
+        return True, valuesDict
+
     ########################################
 
     def getDeviceFactoryUiValues(self, devIdList):
@@ -351,7 +637,8 @@ class Plugin(indigo.PluginBase):
 
             dev = indigo.device.create(indigo.kProtocol.Plugin, address=address, name=name, deviceTypeId="EcobeeThermostat")
             dev.model = "Ecobee Thermostat"
-            dev.subModel = ECOBEE_MODELS.get(device_type, 'Unknown')
+            model = ecobee_models.model(device_type)
+            dev.subModel = model.name
             dev.replaceOnServer()
 
             self.logger.info(f"Created EcobeeThermostat device '{dev.name}'")
@@ -359,16 +646,9 @@ class Plugin(indigo.PluginBase):
             newProps = dev.pluginProps
             newProps["account"] = valuesDict["account"]
             newProps["holdType"] = valuesDict["holdType"]
-            newProps["device_type"] = device_type
-            newProps["NumHumidityInputs"] = 1
-            newProps["ShowCoolHeatEquipmentStateUI"] = True
-
-            # set props based on device type
-
-            if device_type in ['athenaSmart', 'apolloSmart', 'nikeSmart', 'vulcanSmart', 'aresSmart', 'artemisSmart']:
-                newProps["NumTemperatureInputs"] = 2
+            newProps.update(ecobee_models.thermostat_props(device_type))
 
-            if device_type in ['athenaSmart', 'apolloSmart', 'corSmart', 'vulcanSmart', 'aresSmart', 'artemisSmart']:  # Has integral occupancy sensor.
+            if model.occupancy:
 
                 sensor_name = f"{dev.name} Occupancy"
                 self.logger.info(f"Adding Occupancy Sensor '{sensor_name}' to '{dev.name}'")
@@ -381,7 +661,7 @@ class Plugin(indigo.PluginBase):
                 newProps["occupancy"] = newdev.id
                 self.logger.info(f"Created EcobeeThermostat Occupancy device '{newdev.name}'")
 
-            if device_type in ['athenaSmart', 'apolloSmart', 'nikeSmart', 'vulcanSmart', 'aresSmart', 'artemisSmart']:  # Supports linked remote sensors
+            if model.remotes:
 
                 remotes = thermostat.get("remotes")
                 self.logger.debug(f"{dev.name}: {len(remotes)} remotes")
@@ -422,9 +702,11 @@ class Plugin(indigo.PluginBase):
 
         for code, rem in remotes.items():
 
-            for rdev in indigo.devices.iter("self"):
-                if rdev.deviceTypeId == 'RemoteSensor' and rdev.address == code:  # remote device already exists
-                    self.logger.debug(f"Remote sensor device {rdev.address} already exists")
+            existing = self.device_index.lookup(dev.pluginProps["account"], code, 'RemoteSensor')
+            if existing:  # remote device already exists
+                self.logger.debug(f"Remote sensor device {code} already exists")
+                remote_ids[code] = str(existing)
+
             else:
 
                 remote_name = f"{dev.name} Remote - {rem['name']}"
@@ -442,6 +724,94 @@ class Plugin(indigo.PluginBase):
         newProps["remotes"] = remote_ids
         dev.replacePluginPropsOnServer(newProps)
 
+    ########################################
+    # Bulk discovery of all devices for an account
+    ########################################
+
+    def menuDiscoverDevices(self, valuesDict, typeId):
+        self.logger.debug(f"menuDiscoverDevices: valuesDict = {valuesDict}")
+        try:
+            accountID = int(valuesDict["account"])
+            ecobee = self.ecobee_accounts[accountID]
+        except (Exception,):
+            self.logger.error("Bad Ecobee Account specified for device discovery")
+            return False
+
+        self.discover_devices(accountID, ecobee, valuesDict.get("holdType", "nextTransition"), valuesDict.get("createRemotes", True))
+        return True
+
+    # Create every thermostat, occupancy sensor and remote sensor on the account that doesn't have an Indigo device yet.
+    # Devices are created with their final props, so there's no props round trip per device.  Existing devices are found
+    # among all of the plugin's devices, started or not, so running it again creates nothing new.  A device that can't be
+    # created is logged and skipped, the rest are still created.
+
+    def discover_devices(self, accountID, ecobee, holdType="nextTransition", createRemotes=True):
+        folder = indigo.devices[accountID].folderId
+        existing = {(dev.deviceTypeId, dev.address): dev.id for dev in indigo.devices.iter("self") if account_id(dev) == accountID}
+        created = []
+
+        def create(name, address, deviceTypeId, subModel, props):
+            try:
+                newdev = indigo.device.create(indigo.kProtocol.Plugin, address=address, name=name, folder=folder,
+                                              deviceTypeId=deviceTypeId, props=props)
+                newdev.model = "Ecobee Thermostat"
+                newdev.subModel = subModel
+                newdev.replaceOnServer()
+            except Exception as e:
+                self.logger.error(f"{indigo.devices[accountID].name}: Discovery unable to create '{name}': {e}")
+                return None
+            existing[(deviceTypeId, address)] = newdev.id
+            created.append(newdev.name)
+            return newdev.id
+
+        for address, thermostat in ecobee.thermostats.items():
+            device_type = thermostat.get('modelNumber', 'Unknown')
+            model = ecobee_models.model(device_type)
+            name = f"Ecobee {thermostat.get('name')}"
+
+            remote_ids = indigo.Dict()
+            if createRemotes and model.remotes:
+                for code, rem in thermostat.get("remotes", {}).items():
+                    remoteID = existing.get(('RemoteSensor', code))
+                    if not remoteID:
+                        remoteID = create(f"{name} Remote - {rem['name']}", code, "RemoteSensor", "Remote",
+                                          {'SupportsSensorValue': True, 'SupportsStatusRequest': False, 'account': accountID})
+                    if remoteID:
+                        remote_ids[code] = str(remoteID)
+
+            statID = existing.get(('EcobeeThermostat', address))
+            if statID:
+                dev = indigo.devices[statID]
+                if remote_ids and dict(dev.pluginProps.get("remotes", {})) != dict(remote_ids):
+                    newProps = dev.pluginProps
+                    newProps["remotes"] = remote_ids
+                    dev.replacePluginPropsOnServer(newProps)
+                continue
+
+            props = {
+                "SupportsStatusRequest": True,
+                "account": accountID,
+                "holdType": holdType,
+                "remotes": remote_ids,
+            }
+            props.update(ecobee_models.thermostat_props(device_type))
+
+            if model.occupancy:
+                occupancyID = existing.get(('OccupancySensor', address))
+                if not occupancyID:
+                    occupancyID = create(f"{name} Occupancy", address, "OccupancySensor", "Occupancy",
+                                         {'SupportsStatusRequest': False, 'account': accountID})
+                if occupancyID:
+                    props["occupancy"] = occupancyID
+
+            create(name, address, "EcobeeThermostat", model.name, props)
+
+        if created:
+            self.logger.info(f"{indigo.devices[accountID].name}: Discovery created {len(created)} devices: {', '.join(created)}")
+        else:
+            self.logger.info(f"{indigo.devices[accountID].name}: Discovery found no new devices")
+        return created
+
     ######################
     #
     #  Subclass this if you dynamically need to change the device states list provided based on specific device instance data.
@@ -449,132 +819,7 @@ class Plugin(indigo.PluginBase):
     def getDeviceStateList(self, dev):
 
         stateList = indigo.PluginBase.getDeviceStateList(self, dev)
-        device_type = dev.pluginProps.get("device_type", None)
-
-        if device_type in ['athenaSmart', 'corSmart', 'apolloSmart', 'vulcanSmart', 'aresSmart', 'artemisSmart']:
-
-            stateList.append({"Disabled": False,
-                              "Key": "hvacMode",
-                              "StateLabel": "HVAC Mode",
-                              "TriggerLabel": "HVAC Mode",
-                              "Type": 150})
-            stateList.append({"Disabled": False,
-                              "Key": "latestEventType",
-                              "StateLabel": "Last Event",
-                              "TriggerLabel": "Last Event",
-                              "Type": 150})
-            stateList.append({"Disabled": False,
-                              "Key": "device_type",
-                              "StateLabel": "Model",
-                              "TriggerLabel": "Model",
-                              "Type": 150})
-            stateList.append({"Disabled": False,
-                              "Key": "climate",
-                              "StateLabel": "Climate",
-                              "TriggerLabel": "Climate",
-                              "Type": 150})
-            stateList.append({"Disabled": False,
-                              "Key": "equipmentStatus",
-                              "StateLabel": "Status",
-                              "TriggerLabel": "Status",
-                              "Type": 150})
-            stateList.append({"Disabled": False,
-                              "Key": "occupied",
-                              "StateLabel": "Occupied (yes or no)",
-                              "TriggerLabel": "Occupied",
-                              "Type": 52})
-            stateList.append({"Disabled": False,
-                              "Key": "autoAway",
-                              "StateLabel": "Auto-Away (yes or no)",
-                              "TriggerLabel": "Auto-Away",
-                              "Type": 52})
-            stateList.append({"Disabled": False,
-                              "Key": "autoHome",
-                              "StateLabel": "Auto-Home (yes or no)",
-                              "TriggerLabel": "Auto-Home",
-                              "Type": 52})
-            stateList.append({"Disabled": False,
-                              "Key": "fanMinOnTime",
-                              "StateLabel": "Minimum fan time",
-                              "TriggerLabel": "Minimum fan time",
-                              "Type": 100})
-
-        elif device_type in ['nikeSmart', 'attisRetail']:
-
-            stateList.append({"Disabled": False,
-                              "Key": "hvacMode",
-                              "StateLabel": "HVAC Mode",
-                              "TriggerLabel": "HVAC Mode",
-                              "Type": 150})
-            stateList.append({"Disabled": False,
-                              "Key": "latestEventType",
-                              "StateLabel": "Last Event",
-                              "TriggerLabel": "Last Event",
-                              "Type": 150})
-            stateList.append({"Disabled": False,
-                              "Key": "device_type",
-                              "StateLabel": "Model",
-                              "TriggerLabel": "Model",
-                              "Type": 150})
-            stateList.append({"Disabled": False,
-                              "Key": "climate",
-                              "StateLabel": "Climate",
-                              "TriggerLabel": "Climate",
-                              "Type": 150})
-            stateList.append({"Disabled": False,
-                              "Key": "equipmentStatus",
-                              "StateLabel": "Status",
-                              "TriggerLabel": "Status",
-                              "Type": 150})
-            stateList.append({"Disabled": False,
-                              "Key": "autoAway",
-                              "StateLabel": "Auto-Away (yes or no)",
-                              "TriggerLabel": "Auto-Away",
-                              "Type": 52})
-            stateList.append({"Disabled": False,
-                              "Key": "autoHome",
-                              "StateLabel": "Auto-Home (yes or no)",
-                              "TriggerLabel": "Auto-Home",
-                              "Type": 52})
-            stateList.append({"Disabled": False,
-                              "Key": "fanMinOnTime",
-                              "StateLabel": "Minimum fan time",
-                              "TriggerLabel": "Minimum fan time",
-                              "Type": 100})
-
-        elif device_type in ['idtSmart', 'siSmart']:
-
-            stateList.append({"Disabled": False,
-                              "Key": "hvacMode",
-                              "StateLabel": "HVAC Mode",
-                              "TriggerLabel": "HVAC Mode",
-                              "Type": 150})
-            stateList.append({"Disabled": False,
-                              "Key": "latestEventType",
-                              "StateLabel": "Last Event",
-                              "TriggerLabel": "Last Event",
-                              "Type": 150})
-            stateList.append({"Disabled": False,
-                              "Key": "device_type",
-                              "StateLabel": "Model",
-                              "TriggerLabel": "Model",
-                              "Type": 150})
-            stateList.append({"Disabled": False,
-                              "Key": "climate",
-                              "StateLabel": "Climate",
-                              "TriggerLabel": "Climate",
-                              "Type": 150})
-            stateList.append({"Disabled": False,
-                              "Key": "equipmentStatus",
-                              "StateLabel": "Status",
-                              "TriggerLabel": "Status",
-                              "Type": 150})
-            stateList.append({"Disabled": False,
-                              "Key": "fanMinOnTime",
-                              "StateLabel": "Minimum fan time",
-                              "TriggerLabel": "Minimum fan time",
-                              "Type": 100})
-
+        stateList.extend(ecobee_models.state_list(dev.pluginProps.get("device_type", None)))
         return stateList
 
     #    Authentication Step 1, called from Devices.xml
@@ -606,8 +851,8 @@ class Plugin(indigo.PluginBase):
         self.temp_ecobeeAccount.get_tokens()
         if self.temp_ecobeeAccount.authenticated:
             valuesDict["authStatus"] = "Authenticated"
-            self.pluginPrefs[REFRESH_TOKEN_PLUGIN_PREF.format(devId)] = self.temp_ecobeeAccount.refresh_token
-            self.savePluginPrefs()
+            self.tokens.set(devId, self.temp_ecobeeAccount.refresh_token)
+            self.tokens.flush()     # a new authorization, don't risk losing it
         else:
             valuesDict["authStatus"] = "Token Request Failed"
         return valuesDict
@@ -618,6 +863,7 @@ class Plugin(indigo.PluginBase):
 
     # Main thermostat action bottleneck called by Indigo Server.
 
+    @profiled_action
     def actionControlThermostat(self, action, device):
         self.logger.debug(
             f"{device.name}: action.thermostatAction: {action.thermostatAction}, action.actionValue: {action.actionValue}, setpointHeat: {device.heatSetpoint}, setpointCool: {device.coolSetpoint}")
@@ -662,6 +908,7 @@ class Plugin(indigo.PluginBase):
         else:
             self.logger.warning(f"{device.name}: Unimplemented action.thermostatAction: {action.thermostatAction}")
 
+    @profiled_action
     def actionControlUniversal(self, action, device):
         self.logger.debug(f"{device.name}: action.actionControlUniversal: {action.deviceAction}")
         if action.deviceAction == indigo.kUniversalAction.RequestStatus:
@@ -673,6 +920,7 @@ class Plugin(indigo.PluginBase):
     # Activate Comfort Setting callback
     ########################################
 
+    @profiled_action
     def actionActivateComfortSetting(self, action, device):
         self.logger.debug(f"{device.name}: actionActivateComfortSetting")
         defaultHold = device.pluginProps.get("holdType", "nextTransition")
@@ -689,6 +937,7 @@ class Plugin(indigo.PluginBase):
         # Set Heat Mode
         ########################################
 
+    @profiled_action
     def actionSetMode(self, action, device):
         mode = action.props.get("mode", "auto")
         self.logger.debug(f"{device.name}: actionSetMode: {mode}")
@@ -700,6 +949,7 @@ class Plugin(indigo.PluginBase):
         # Set Hold Type
         ########################################
 
+    @profiled_action
     def actionSetDefaultHoldType(self, action, device):
         self.logger.debug(f"{device.name}: actionSetDefaultHoldType")
 
@@ -744,7 +994,7 @@ class Plugin(indigo.PluginBase):
         self.update_needed = True
         if stateKey in device.states:
             self.logger.debug(f'{device.name}: updating state {stateKey} to: {newSetpoint}')
-            device.updateStateOnServer(stateKey, newSetpoint, uiValue=f"{newSetpoint:.1f} °F")
+            device.updateStateOnServer(stateKey, newSetpoint, uiValue=f"{newSetpoint:.1f}{EcobeeDevice.temperatureFormatter.suffix()}")
 
     ########################################
     # Process action request from Indigo Server to change fan mode.
@@ -771,12 +1021,14 @@ class Plugin(indigo.PluginBase):
     # Resume Program callbacks
     ########################################
 
+    @profiled_action
     def menuResumeAllPrograms(self):
         self.logger.debug("menuResumeAllPrograms")
         for devId, thermostat in self.ecobee_thermostats.items():
             if indigo.devices[devId].deviceTypeId == 'EcobeeThermostat':
                 thermostat.resume_program()
 
+    @profiled_action
     def menuResumeProgram(self, valuesDict, typeId):
         self.logger.debug("menuResumeProgram")
         try:
@@ -796,16 +1048,248 @@ class Plugin(indigo.PluginBase):
             account.dump_data()
         return True
 
+    def menuDumpMetrics(self):
+        self.logger.debug("menuDumpMetrics")
+        for accountID, account in self.ecobee_accounts.items():
+            self.logger.info(f"{indigo.devices[accountID].name}: API metrics\n{account.metrics.report()}")
+        return True
+
+    def menuDumpTrace(self):
+        self.logger.debug("menuDumpTrace")
+        self.logger.info(f"Trace spans\n{tracer.dump()}")
+        return True
+
+    def menuProfileCycles(self, valuesDict, typeId):
+        self.logger.debug(f"menuProfileCycles: valuesDict = {valuesDict}")
+        errorDict = indigo.Dict()
+        try:
+            cycles = int(valuesDict.get("cycles", "3"))
+            if cycles < 1:
+                raise ValueError
+        except ValueError:
+            errorDict['cycles'] = "Enter a number of update cycles (at least 1)"
+        try:
+            top = int(valuesDict.get("topFunctions", "25"))
+            if top < 1:
+                raise ValueError
+        except ValueError:
+            errorDict['topFunctions'] = "Enter a number of functions (at least 1)"
+        if len(errorDict) > 0:
+            return False, valuesDict, errorDict
+
+        self.profiler.start(cycles, bool(valuesDict.get("includeActions", False)), top)
+        if valuesDict.get("startNow", True):
+            self.update_needed = True
+        return True
+
+    ########################################
+    # Recent readings callback
+    ########################################
+
+    @profiled_action
+    def actionQueryRecentReadings(self, action, device):
+        self.logger.debug(f"{device.name}: actionQueryRecentReadings")
+
+        ecobee_device = self.ecobee_thermostats.get(device.id) or self.ecobee_remotes.get(device.id)
+        if not ecobee_device:
+            self.logger.warning(f"{device.name}: no recent readings for this device type")
+            return None
+
+        field = action.props.get("field", "temperature")
+        try:
+            window = float(action.props.get("window", "20")) * 60.0
+        except ValueError:
+            self.logger.error(f"{device.name}: invalid window for recent readings query")
+            return None
+
+        result = ecobee_device.recent.stats(field, window)
+        self.logger.debug(f"{device.name}: recent {field} = {result}")
+
+        variableID = action.props.get("variable", "")
+        if variableID:
+            try:
+                indigo.variable.updateValue(int(variableID), value=json.dumps(result))
+            except Exception as e:
+                self.logger.error(f"{device.name}: unable to save recent readings to variable {variableID}: {e}")
+        return result
+
+    ########################################
+    # History store callbacks
+    ########################################
+
+    def historyDeviceList(self, filter="", valuesDict=None, typeId="", targetId=0):  # noqa
+        deviceTypeId = 'RemoteSensor' if valuesDict and valuesDict.get("historyKind") == "sensor" else 'EcobeeThermostat'
+        retList = []
+        for device in indigo.devices.iter("self"):
+            if device.deviceTypeId == deviceTypeId:
+                retList.append((str(device.id), device.name))
+        retList.sort(key=lambda tup: tup[1])
+        retList.insert(0, ("0", "All Devices"))
+        return retList
+
+    def history_query_args(self, props):
+        kind = props.get("historyKind", "thermostat")
+
+        addresses = None
+        account = None
+        devId = int(props.get("historyDevice", "0") or "0")
+        if devId:
+            addresses = [indigo.devices[devId].address]
+            account = account_id(indigo.devices[devId])
+
+        try:
+            start = props.get("historyStart", "")
+            start = time.mktime(time.strptime(start, HISTORY_TIME_FORMAT)) if start else None
+            end = props.get("historyEnd", "")
+            end = time.mktime(time.strptime(end, HISTORY_TIME_FORMAT)) if end else None
+        except ValueError:
+            self.logger.error("Invalid history time range, use the format YYYY-MM-DD HH:MM")
+            return None
+
+        return kind, addresses, start, end, account
+
+    def export_history(self, props):
+        if not self.history:
+            self.logger.warning("History store is not enabled in the plugin config")
+            return False
+
+        args = self.history_query_args(props)
+        if not args:
+            return False
+        kind, addresses, start, end, account = args
+
+        path = props.get("historyFile", "") or os.path.join(self.data_folder, f"{kind}_history.csv")
+        try:
+            count = self.history.export_csv(path, kind, EcobeeDevice.temperatureFormatter, addresses, start, end, account)
+        except Exception as e:
+            self.logger.error(f"History export to {path} failed: {e}")
+            return False
+        self.logger.info(f"Exported {count} {kind} history records to {path}")
+        return True
+
+    def menuExportHistory(self, valuesDict, typeId):
+        self.logger.debug("menuExportHistory")
+        return self.export_history(valuesDict)
+
+    @profiled_action
+    def actionExportHistory(self, action):
+        self.logger.debug("actionExportHistory")
+        self.export_history(action.props)
+
+    @profiled_action
+    def actionQueryHistory(self, action):
+        self.logger.debug("actionQueryHistory")
+        if not self.history:
+            self.logger.warning("History store is not enabled in the plugin config")
+            return []
+
+        args = self.history_query_args(action.props)
+        if not args:
+            return []
+        kind, addresses, start, end, account = args
+        return self.history.query(kind, addresses, start, end, account)
+
+    @profiled_action
     def actionResumeAllPrograms(self, action):
         self.logger.debug("actionResumeAllPrograms")
         for devId, thermostat in self.ecobee_thermostats.items():
             if indigo.devices[devId].deviceTypeId == 'EcobeeThermostat':
                 thermostat.resume_program()
 
+    @profiled_action
     def actionResumeProgram(self, action, device):
         self.logger.debug(f"{device.name}: actionResumeProgram")
         self.ecobee_thermostats[device.id].resume_program()
 
+    ########################################
+    # Group actions.  The selected thermostats, and those in a zone, are sent one request per account with all of
+    # that account's thermostats in the selectionMatch.  The result maps each thermostat device id to the outcome of
+    # its account's request: sent, failed or queued.
+    ########################################
+
+    def group_thermostats(self, props):
+        devIds = set()
+        for devId in props.get("thermostats", []):
+            try:
+                devIds.add(int(devId))
+            except ValueError:
+                continue
+
+        zone = self.zones.zones.get(int(props.get("zone", "0") or "0"))
+        for member in (zone.members if zone else []):
+            if member in self.ecobee_thermostats:
+                devIds.add(member)
+            elif member in self.ecobee_remotes:         # a remote sensor stands for the thermostat it belongs to
+                remote = self.ecobee_remotes[member]
+                sensor = remote.ecobee.sensors.get(remote.address) if remote.ecobee else None
+                devId = sensor and self.device_index.lookup(remote.ecobee.devID, sensor["thermostat"], 'EcobeeThermostat')
+                if devId:
+                    devIds.add(devId)
+
+        return [devId for devId in sorted(devIds) if devId in self.ecobee_thermostats]
+
+    def group_request(self, props, log_msg_action, make_body):
+        by_account = {}
+        results = {}
+        for devId in self.group_thermostats(props):
+            account = self.ecobee_accounts.get(account_id(indigo.devices[devId]))
+            if not account:
+                self.logger.warning(f"{indigo.devices[devId].name}: no Ecobee account, skipping {log_msg_action}")
+                results[str(devId)] = COMMAND_FAILED
+                continue
+            by_account.setdefault(account, []).append(devId)
+
+        for account, devIds in by_account.items():
+            match = ",".join(self.ecobee_thermostats[devId].address for devId in devIds)
+            result = account.make_request(make_body(match), f"{log_msg_action} on {len(devIds)} thermostats")
+            for devId in devIds:
+                results[str(devId)] = result
+
+        self.logger.info(f"Group {log_msg_action}: {len(results)} thermostats, {len(by_account)} requests, "
+                         f"{', '.join(f'{list(results.values()).count(outcome)} {outcome}' for outcome in sorted(set(results.values())))}")
+        self.update_needed = True
+        return results
+
+    @profiled_action
+    def actionGroupActivateComfortSetting(self, action):
+        climate = action.props.get("climate")
+        holdType = action.props.get("holdType", "nextTransition")
+        return self.group_request(action.props, "set climate hold", lambda match: climate_hold_body(match, climate, holdType))
+
+    @profiled_action
+    def actionGroupSetMode(self, action):
+        mode = action.props.get("mode", "auto")
+        return self.group_request(action.props, "set HVAC mode", lambda match: hvac_mode_body(match, mode))
+
+    @profiled_action
+    def actionGroupResumeProgram(self, action):
+        return self.group_request(action.props, "resume program", resume_program_body)
+
+    @profiled_action
+    def actionGroupSetDefaultHoldType(self, action):
+        holdType = action.props.get("holdType", "nextTransition")
+        results = {}
+        for devId in self.group_thermostats(action.props):       # plugin props only, nothing is sent to Ecobee
+            device = indigo.devices[devId]
+            props = device.pluginProps
+            props["holdType"] = holdType
+            device.replacePluginPropsOnServer(props)
+            results[str(devId)] = "set"
+        return results
+
+    def groupClimateList(self, filter="", valuesDict=None, typeId="", targetId=0):    # noqa
+        climates = {}
+        for thermostat in self.ecobee_thermostats.values():
+            if thermostat.ecobee and thermostat.address in thermostat.ecobee.thermostats:
+                climates.update(thermostat.get_climates())
+        return sorted(climates.items(), key=lambda climate: climate[1])
+
+    def pickZone(self, filter=None, valuesDict=None, typeId=0):   # noqa
+        retList = [(str(devId), indigo.devices[devId].name) for devId in self.zones.zones]
+        retList.sort(key=lambda tup: tup[1])
+        retList.insert(0, ("0", "None"))
+        return retList
+
     def pickThermostat(self, filter=None, valuesDict=None, typeId=0):   # noqa
         retList = []
         for device in indigo.devices.iter("self"):
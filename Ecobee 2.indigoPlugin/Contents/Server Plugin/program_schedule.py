@@ -0,0 +1,62 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import bisect
+import calendar
+import functools
+import time
+
+#
+# Local copy of each thermostat's weekly program.  Ecobee sends the program as seven days (Monday first) of 48 half
+# hour slots, each naming a climate.  That is reduced once to a sorted index of the slots where the climate changes, so
+# finding the next transition is a binary search.  Thermostats with the same program share one index.
+#
+# The program runs in the thermostat's local time.  Its offset from UTC is taken from the thermostatTime and utcTime
+# the thermostat reports, so the plugin's own time zone doesn't matter.
+#
+
+SLOT_MINUTES = 30
+WEEK_MINUTES = 7 * 24 * 60
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+@functools.lru_cache(maxsize=64)
+def _index(schedule):
+    slots = [climate for day in schedule for climate in day]
+    starts = []
+    climates = []
+    for slot, climate in enumerate(slots):
+        if climate != slots[slot - 1]:      # slot 0 compares with the last slot of the week
+            starts.append(slot * SLOT_MINUTES)
+            climates.append(climate)
+    return tuple(starts), tuple(climates)
+
+
+def transition_index(schedule):
+    """(start minutes of the week, climateRefs) for the slots where the program changes climate, both empty if it
+    never does."""
+    if not schedule:
+        return (), ()
+    return _index(tuple(tuple(day) for day in schedule))
+
+
+def utc_offset(thermostat_time, utc_time):
+    """Seconds the thermostat's clock is ahead of UTC, to the nearest quarter hour."""
+    try:
+        offset = calendar.timegm(time.strptime(thermostat_time, TIME_FORMAT)) - calendar.timegm(time.strptime(utc_time, TIME_FORMAT))
+    except (TypeError, ValueError):
+        return 0
+    return round(offset / 900.0) * 900
+
+
+def next_transition(index, offset, now=None):
+    """The next scheduled climate change as (climateRef, epoch seconds), or None if the program has no changes."""
+    starts, climates = index
+    if not starts:
+        return None
+    now = now or time.time()
+    local = time.gmtime(now + offset)
+    minute = local.tm_wday * 1440 + local.tm_hour * 60 + local.tm_min
+    position = bisect.bisect_right(starts, minute) % len(starts)
+    minutes_ahead = (starts[position] - minute) % WEEK_MINUTES or WEEK_MINUTES
+    return climates[position], int(now) - local.tm_sec + minutes_ahead * 60
@@ -0,0 +1,103 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import math
+import time
+from array import array
+
+#
+# Fixed capacity, array backed ring buffer of recent readings for a single device.  Memory use is set by the capacity
+# and never grows.  Missing values are stored as NaN.
+#
+
+FIELDS = ('timestamp', 'temperature', 'humidity', 'occupancy')
+
+NAN = float('nan')
+
+
+def _value(v):
+    if v is None:
+        return NAN
+    if v in (True, 'true'):
+        return 1.0
+    if v in (False, 'false'):
+        return 0.0
+    try:
+        return float(v)
+    except (TypeError, ValueError):     # Ecobee reports a missing reading as "unknown"
+        return NAN
+
+
+class RingBuffer:
+
+    def __init__(self, capacity):
+        self.capacity = max(int(capacity), 1)
+        self.columns = {field: array('d', [NAN]) * self.capacity for field in FIELDS}
+        self.head = 0       # index of the next write
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def clear(self):
+        self.head = 0
+        self.count = 0
+
+    def append(self, timestamp, temperature=None, humidity=None, occupancy=None):
+        i = self.head
+        self.columns['timestamp'][i] = timestamp
+        self.columns['temperature'][i] = _value(temperature)
+        self.columns['humidity'][i] = _value(humidity)
+        self.columns['occupancy'][i] = _value(occupancy)
+        self.head = (i + 1) % self.capacity
+        if self.count < self.capacity:
+            self.count += 1
+
+    # Indexes of the samples newer than the cutoff, newest first.  Stops at the first older sample, so the cost is
+    # proportional to the size of the window, not the capacity.
+
+    def _window(self, seconds, now):
+        cutoff = now - seconds
+        timestamps = self.columns['timestamp']
+        i = self.head
+        for _ in range(self.count):
+            i = (i - 1) % self.capacity
+            if timestamps[i] < cutoff:
+                return
+            yield i
+
+    def latest(self):
+        if not self.count:
+            return None
+        i = (self.head - 1) % self.capacity
+        return {field: self.columns[field][i] for field in FIELDS}
+
+    def stats(self, field, seconds, now=None):
+        now = now or time.time()
+        timestamps = self.columns['timestamp']
+        values = self.columns[field]
+
+        n = 0
+        lo = hi = None
+        sum_t = sum_v = sum_tt = sum_tv = 0.0
+        for i in self._window(seconds, now):
+            v = values[i]
+            if math.isnan(v):
+                continue
+            t = (timestamps[i] - now) / 3600.0     # hours, relative to now to keep the sums well conditioned
+            n += 1
+            lo = v if lo is None else min(lo, v)
+            hi = v if hi is None else max(hi, v)
+            sum_t += t
+            sum_v += v
+            sum_tt += t * t
+            sum_tv += t * v
+
+        result = {'field': field, 'window': seconds, 'count': n, 'min': lo, 'max': hi, 'mean': None, 'slope': None}
+        if n:
+            result['mean'] = sum_v / n
+        if n > 1:
+            denominator = n * sum_tt - sum_t * sum_t
+            if denominator:
+                result['slope'] = (n * sum_tv - sum_t * sum_v) / denominator     # change per hour
+        return result
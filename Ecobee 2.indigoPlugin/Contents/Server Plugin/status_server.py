@@ -0,0 +1,87 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import hashlib
+import http.server
+import json
+import logging
+import threading
+
+#
+# Optional read-only HTTP server for the plugin's cached Ecobee data, so dashboards can read it without going through
+# the Indigo server.  The plugin publishes a new snapshot after each update cycle; it is serialized once, then served
+# as is to every request, with an ETag so an unchanged snapshot costs a 304 and no body.
+#
+#   GET /                   all accounts
+#   GET /accounts/<id>      one account, by Indigo device id
+#
+
+
+class StatusHandler(http.server.BaseHTTPRequestHandler):
+
+    server_version = "EcobeeStatus/1.0"
+
+    def do_GET(self):
+        self.respond(include_body=True)
+
+    def do_HEAD(self):
+        self.respond(include_body=False)
+
+    def respond(self, include_body):
+        path = self.path.split("?", 1)[0].rstrip("/") or "/"
+        entry = self.server.status.bodies.get(path)
+        if not entry:
+            self.send_error(404, "Not Found")
+            return
+
+        body, etag = entry
+        if etag in [tag.strip() for tag in self.headers.get("If-None-Match", "").split(",")]:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        if include_body:
+            self.wfile.write(body)
+
+    def log_message(self, fmt, *args):
+        self.server.status.logger.threaddebug(f"{self.address_string()} {fmt % args}")
+
+
+class StatusServer:
+
+    def __init__(self, host="127.0.0.1", port=8178):
+        self.logger = logging.getLogger("Plugin.StatusServer")
+        self.host = host
+        self.port = port
+        self.bodies = {}        # path -> (JSON bytes, ETag)
+        self.httpd = http.server.ThreadingHTTPServer((host, port), StatusHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.status = self
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="StatusServer", daemon=True)
+        self.thread.start()
+        self.logger.info(f"Status server listening on http://{host}:{port}/")
+
+    @staticmethod
+    def encode(data):
+        body = json.dumps(data, sort_keys=True, separators=(',', ':'), default=str).encode("utf-8")
+        return body, f'"{hashlib.sha1(body).hexdigest()[:20]}"'
+
+    def publish(self, accounts):
+        """Replace the served snapshot.  accounts maps account device id to that account's snapshot dict."""
+        bodies = {"/": self.encode({"accounts": accounts})}
+        for accountID, account in accounts.items():
+            bodies[f"/accounts/{accountID}"] = self.encode(account)
+        self.bodies = bodies
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.thread.join(timeout=5.0)
+        self.logger.info("Status server stopped")
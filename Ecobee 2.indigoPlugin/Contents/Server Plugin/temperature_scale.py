@@ -3,17 +3,50 @@
 
 FORMAT_STRING = "{0:.1f}"
 
+# Range of the lookup table, in Ecobee units (F x 10).  Readings outside it are converted directly.
+TABLE_MIN = -500
+TABLE_MAX = 1500
+
 def round_to_nearest_half_int(num):
     return round(num * 2) / 2
 
 class TemperatureScale:
 
+    def __init__(self):
+        self.table = None
+
+    # Every Ecobee reading is an integer, so the converted value and its display string are looked up in a table built
+    # the first time the scale is used, instead of converting and formatting each reading on every update.
+
+    def build_table(self):
+        self.table = [self.convert_reading(raw) for raw in range(TABLE_MIN, TABLE_MAX + 1)]
+
+    def convert_reading(self, raw):
+        value = self.convertFromEcobee(raw)
+        return value, f"{FORMAT_STRING.format(value)}{self.suffix()}"
+
+    # (value, uiValue) for a raw Ecobee reading, int or digit string.  Floats (averaged history readings) aren't in the table.
+    def reading(self, raw):
+        if isinstance(raw, float):
+            return self.convert_reading(raw)
+        table = self.table
+        if table is None:
+            self.build_table()
+            table = self.table
+        index = int(raw) - TABLE_MIN
+        if 0 <= index <= TABLE_MAX - TABLE_MIN:
+            return table[index]
+        return self.convert_reading(raw)
+
+    def readings(self, raws):
+        return [self.reading(raw) for raw in raws]
+
     def report(self, dev, stateKey, reading):
-        dev.updateStateOnServer(key=stateKey, value=self.convertFromEcobee(reading), decimalPlaces=1, uiValue=self.format(reading))
-        return txt
+        value, uiValue = self.reading(reading)
+        dev.updateStateOnServer(key=stateKey, value=value, decimalPlaces=1, uiValue=uiValue)
 
     def format(self, reading):
-        return f"{FORMAT_STRING.format(self.convertFromEcobee(reading))}{self.suffix()}"
+        return self.reading(reading)[1]
 
 
 class Fahrenheit(TemperatureScale):
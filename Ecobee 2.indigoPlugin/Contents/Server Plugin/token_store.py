@@ -0,0 +1,97 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+import logging
+import os
+import threading
+
+#
+# Refresh tokens for the account devices, kept in their own small file instead of the plugin prefs.  Ecobee rotates
+# the refresh token on every token refresh, and saving the prefs rewrites all of them synchronously.  Here a token is
+# only written when it actually changed, writes within TOKEN_SAVE_DELAY are combined into one on a timer thread, and
+# the file is replaced atomically.  flush() writes anything pending, at shutdown.
+#
+
+TOKEN_FILE = 'tokens.json'
+TOKEN_SAVE_DELAY = 5.0      # seconds
+
+
+class TokenStore:
+
+    def __init__(self, path, delay=TOKEN_SAVE_DELAY):
+        self.logger = logging.getLogger("Plugin.TokenStore")
+        self.path = path
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()
+        self.tokens = {}        # account device id (as a string) -> refresh token
+        self.dirty = False
+        self.timer = None
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as f:
+                self.tokens = json.load(f)
+        except (Exception,) as e:
+            self.logger.error(f"Unable to read saved tokens from {self.path}: {e}")
+
+    def get(self, dev_id, default=None):
+        with self.lock:
+            return self.tokens.get(str(dev_id), default)
+
+    def set(self, dev_id, token):
+        """Store a token, scheduling a write if it changed.  Returns True if it changed."""
+        with self.lock:
+            if not token or self.tokens.get(str(dev_id)) == token:
+                return False
+            self.tokens[str(dev_id)] = token
+            self.dirty = True
+            if not self.timer:
+                self.timer = threading.Timer(self.delay, self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+        return True
+
+    def migrate(self, prefs, pref_format):
+        """Move tokens saved in the plugin prefs by earlier versions into the store.  The prefs are only removed once
+        the store has been written, so a failed write leaves them for the next start.  Returns the number moved."""
+        prefix = pref_format.format("")
+        keys = [key for key in prefs.keys() if key.startswith(prefix)]
+        moved = 0
+        for key in keys:
+            if self.get(key[len(prefix):]) is None:
+                self.set(key[len(prefix):], prefs[key])
+                moved += 1
+        if not keys or not self.flush():
+            return 0
+        for key in keys:
+            del prefs[key]
+        return moved
+
+    def flush(self):
+        """Write any pending changes now.  Returns False if the write failed."""
+        with self.write_lock:
+            with self.lock:
+                if self.timer:
+                    self.timer.cancel()
+                    self.timer = None
+                if not self.dirty:
+                    return True
+                tokens = dict(self.tokens)
+                self.dirty = False
+            try:
+                temp = f"{self.path}.tmp"
+                with open(os.open(temp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "w") as f:
+                    json.dump(tokens, f)
+                os.replace(temp, self.path)
+                self.logger.threaddebug(f"Saved {len(tokens)} tokens to {self.path}")
+            except (Exception,) as e:
+                self.logger.error(f"Unable to save tokens to {self.path}: {e}")
+                with self.lock:
+                    self.dirty = True
+                return False
+        return True
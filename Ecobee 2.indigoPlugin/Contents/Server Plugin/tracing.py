@@ -0,0 +1,93 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import collections
+import contextlib
+import itertools
+import json
+import logging
+import threading
+import time
+
+#
+# Structured tracing for the poll cycle and thermostat commands.  Each span is timed and kept in a fixed size ring of
+# recent spans, which can be written to the log on demand.  Spans are only formatted when they are logged, so below
+# DEBUG level the cost is one small object per span.
+#
+
+THREADDEBUG = 5         # Indigo's extra log level below DEBUG
+TRACE_CAPACITY = 1000   # spans kept in memory
+
+
+class Span:
+    __slots__ = ('seq', 'name', 'attrs', 'parent', 'depth', 'thread', 'start', 'duration', 'error')
+
+    def __init__(self, seq, name, attrs, parent):
+        self.seq = seq
+        self.name = name
+        self.attrs = attrs
+        self.parent = parent
+        self.depth = parent.depth + 1 if parent else 0
+        self.thread = threading.current_thread().name
+        self.start = time.time()
+        self.duration = None
+        self.error = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def __str__(self):
+        duration = f"{self.duration * 1000.0:.1f} ms" if self.duration is not None else "running"
+        attrs = " ".join(f"{k}={v}" for k, v in self.attrs.items())
+        error = f" error={self.error}" if self.error else ""
+        return f"{'  ' * self.depth}{self.name} {duration} {attrs}{error}"
+
+
+class Tracer:
+
+    def __init__(self, capacity=TRACE_CAPACITY):
+        self.logger = logging.getLogger("Plugin.Trace")
+        self.spans = collections.deque(maxlen=capacity)
+        self.local = threading.local()
+        self.sequence = itertools.count()
+
+    @contextlib.contextmanager
+    def span(self, name, **attrs):
+        span = Span(next(self.sequence), name, attrs, getattr(self.local, 'current', None))
+        self.local.current = span
+        start = time.perf_counter()
+        try:
+            yield span
+        except Exception as e:
+            span.error = repr(e)
+            raise
+        finally:
+            span.duration = time.perf_counter() - start
+            self.local.current = span.parent
+            self.spans.append(span)
+            self.logger.debug("%s", span)
+
+    def dump(self):
+        spans = sorted(self.spans, key=lambda span: span.seq)     # spans finish after their children, list them in start order
+        lines = [f"{len(spans)} recent spans, oldest first"]
+        for span in spans:
+            lines.append(f"{time.strftime('%H:%M:%S', time.localtime(span.start))} [{span.thread}] {span}")
+        return "\n".join(lines)
+
+    def clear(self):
+        self.spans.clear()
+
+
+tracer = Tracer()
+
+
+# Defers the JSON serialization of a log argument until a handler actually formats the record
+
+class LazyJson:
+    __slots__ = ('data',)
+
+    def __init__(self, data):
+        self.data = data
+
+    def __str__(self):
+        return json.dumps(self.data, sort_keys=True, indent=4, separators=(',', ': '))
@@ -0,0 +1,115 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import logging
+
+import indigo
+
+#
+# Zone devices aggregate the temperature and occupancy of selected remote sensors and thermostats (their built-in
+# sensor).  Member devices report their raw Ecobee readings from their own update, a zone is only recomputed when one of
+# its members' readings changed, and only its changed states are written, once per update cycle.  Aggregates are taken
+# on the raw readings (F x 10) and converted to the plugin's scale once.
+#
+
+
+class Zone:
+
+    def __init__(self, dev_id, members, occupancy_mode):
+        self.devID = dev_id
+        self.members = members
+        self.occupancy_mode = occupancy_mode     # 'any' or 'all', which occupancy the device's on state follows
+        self.dirty = True
+        self.written = {}       # state key -> last value written
+
+
+class ZoneAggregates:
+
+    def __init__(self):
+        self.logger = logging.getLogger("Plugin.ZoneAggregates")
+        self.zones = {}         # zone device id -> Zone
+        self.members = {}       # member device id -> set of zone device ids
+        self.readings = {}      # member device id -> (raw temperature or None, occupied or None), kept when its zones
+                                # are removed so a restarted or edited zone has them right away
+
+    def add(self, dev):
+        self.remove(dev.id)
+        members = []
+        for member in dev.pluginProps.get("members", []):
+            try:
+                members.append(int(member))
+            except ValueError:
+                continue
+        self.zones[dev.id] = Zone(dev.id, members, dev.pluginProps.get("occupancyMode", "any"))
+        for member in members:
+            self.members.setdefault(member, set()).add(dev.id)
+
+    def remove(self, dev_id):
+        zone = self.zones.pop(dev_id, None)
+        if not zone:
+            return
+        for member in zone.members:
+            zone_ids = self.members.get(member, set())
+            zone_ids.discard(dev_id)
+            if not zone_ids:
+                self.members.pop(member, None)
+
+    def report(self, member_id, temperature, occupied):
+        """Called from a member device's update.  temperature is the raw Ecobee reading, None when the sensor isn't
+        reporting one, occupied a bool or None."""
+        zone_ids = self.members.get(member_id)
+        if not zone_ids:
+            return
+        reading = (temperature, occupied)
+        if self.readings.get(member_id) == reading:
+            return
+        self.readings[member_id] = reading
+        for zone_id in zone_ids:
+            self.zones[zone_id].dirty = True
+
+    def invalidate(self):
+        """Recompute every zone on the next publish, after the temperature scale changes."""
+        for zone in self.zones.values():
+            zone.dirty = True
+            zone.written.clear()
+
+    def publish(self, formatter):
+        for zone in self.zones.values():
+            if not zone.dirty:
+                continue
+            if not zone.written and not any(member in self.readings for member in zone.members):
+                continue        # nothing to show until a member has reported, rather than zeros
+            zone.dirty = False
+            update_list = [state for state in self.states(zone, formatter) if zone.written.get(state['key']) != state['value']]
+            if not update_list:
+                continue
+            for state in update_list:
+                zone.written[state['key']] = state['value']
+            self.logger.debug(f"zone {zone.devID}: {len(update_list)} states changed")
+            indigo.devices[zone.devID].updateStatesOnServer(update_list)
+
+    def states(self, zone, formatter):
+        readings = [self.readings[member] for member in zone.members if member in self.readings]
+        temperatures = [temperature for temperature, occupied in readings if temperature is not None]
+        occupancy = [occupied for temperature, occupied in readings if occupied is not None]
+
+        update_list = [{'key': "membersReporting", 'value': len(temperatures)}]
+        if temperatures:
+            mean, meanUi = formatter.reading(sum(temperatures) / float(len(temperatures)))
+            low, lowUi = formatter.reading(min(temperatures))
+            high, highUi = formatter.reading(max(temperatures))
+            mean = round(mean, 1)
+            update_list.extend([
+                {'key': "sensorValue", 'value': mean, 'uiValue': meanUi, 'decimalPlaces': 1},
+                {'key': "temperatureMean", 'value': mean, 'uiValue': meanUi, 'decimalPlaces': 1},
+                {'key': "temperatureMin", 'value': low, 'uiValue': lowUi, 'decimalPlaces': 1},
+                {'key': "temperatureMax", 'value': high, 'uiValue': highUi, 'decimalPlaces': 1},
+            ])
+        occupiedAny = any(occupancy)
+        occupiedAll = bool(occupancy) and all(occupancy)
+        update_list.extend([
+            {'key': "occupiedAny", 'value': occupiedAny},
+            {'key': "occupiedAll", 'value': occupiedAll},
+            {'key': "onOffState", 'value': occupiedAll if zone.occupancy_mode == "all" else occupiedAny},
+        ])
+        return update_list
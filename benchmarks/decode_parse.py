@@ -0,0 +1,93 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#
+# Decode and parse cost of /1/thermostat responses, without the network.  Compares the old response handling, which
+# decoded the body twice (request.json() for thermostatList, then again for status), with the single decode the plugin
+# does now, using the standard library and orjson when it's installed.  The parse column is
+# EcobeeAccount.parse_thermostats building the snapshot from the decoded payload.
+#
+#   python3 benchmarks/decode_parse.py
+#   python3 benchmarks/decode_parse.py --sizes 50,200 --remotes 4 --iterations 50
+#   python3 benchmarks/decode_parse.py --payload my_thermostat_response.json
+#
+
+import argparse
+import json
+import statistics
+import time
+
+import payloads
+from run_benchmarks import load_plugin
+
+
+class _Dev:
+    name = "benchmark"
+
+
+def timed(func, iterations):
+    times = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000.0
+
+
+def measure(thermostat_list, iterations):
+    load_plugin()
+    import json_codec      # noqa
+    from ecobee_account import EcobeeAccount   # noqa
+
+    body = json.dumps(payloads.response(thermostat_list)).encode("utf-8")
+    account = EcobeeAccount(None)
+
+    def double_stdlib():
+        # what requests' Response.json() does, twice
+        text = body.decode("utf-8")
+        json.loads(text)["thermostatList"]
+        json.loads(text)["status"]
+
+    row = {
+        "thermostats": len(thermostat_list),
+        "kbytes": len(body) / 1024.0,
+        "double_json_ms": timed(double_stdlib, iterations),
+        "single_json_ms": timed(lambda: json.loads(body), iterations),
+    }
+    try:
+        import orjson
+        row["single_orjson_ms"] = timed(lambda: orjson.loads(body), iterations)
+    except ImportError:
+        row["single_orjson_ms"] = None
+
+    decoded = json_codec.loads(body)["thermostatList"]
+    row["parse_ms"] = timed(lambda: account.parse_thermostats(_Dev, decoded, time.time(), 1), iterations)
+    row["decoder"] = json_codec.DECODER
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Decode and parse cost of Ecobee thermostat responses")
+    parser.add_argument("--sizes", default="50,100,250", help="thermostats in each payload")
+    parser.add_argument("--remotes", type=int, default=4, help="remote sensors per thermostat")
+    parser.add_argument("--payload", help="recorded /1/thermostat response or API cassette, instead of synthetic payloads")
+    parser.add_argument("--iterations", type=int, default=30)
+    args = parser.parse_args()
+
+    if args.payload:
+        lists = [payloads.load_recorded(args.payload)]
+    else:
+        lists = [payloads.account("S", int(size), args.remotes) for size in args.sizes.split(",")]
+
+    print(f"{'thermostats':>12}{'KiB':>9}{'2x json ms':>12}{'1x json ms':>12}{'1x orjson ms':>14}{'parse ms':>10}{'old total':>11}{'new total':>11}")
+    for thermostat_list in lists:
+        row = measure(thermostat_list, args.iterations)
+        single = row["single_orjson_ms"] if row["decoder"] == "orjson" else row["single_json_ms"]
+        orjson_ms = f"{row['single_orjson_ms']:>14.2f}" if row["single_orjson_ms"] is not None else f"{'-':>14}"
+        print(f"{row['thermostats']:>12}{row['kbytes']:>9.0f}{row['double_json_ms']:>12.2f}{row['single_json_ms']:>12.2f}{orjson_ms}"
+              f"{row['parse_ms']:>10.2f}{row['double_json_ms'] + row['parse_ms']:>11.2f}{single + row['parse_ms']:>11.2f}")
+    print(f"plugin decoder: {row['decoder']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#
+# Minimal stand-in for the Indigo 'indigo' module, just enough to run the plugin outside of the Indigo server.
+# Every write to the (fake) Indigo server is counted, so benchmarks can report Indigo writes per poll cycle.
+#
+
+import builtins
+import logging
+import sys
+import tempfile
+import time
+
+THREADDEBUG = 5
+
+
+class Counters:
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.state_writes = 0           # individual state values written
+        self.state_calls = 0            # updateStateOnServer / updateStatesOnServer calls
+        self.image_writes = 0
+        self.props_writes = 0
+        self.broadcasts = 0
+        self.writes_by_type = {}        # deviceTypeId -> state, image and props writes to devices of that type
+
+    def count(self, dev, writes):
+        self.writes_by_type[dev.deviceTypeId] = self.writes_by_type.get(dev.deviceTypeId, 0) + writes
+
+    def as_dict(self):
+        return {key: (dict(value) if isinstance(value, dict) else value) for key, value in vars(self).items()}
+
+
+counters = Counters()
+
+
+class _Enum:
+
+    def __init__(self, name, *members):
+        self._name = name
+        for i, member in enumerate(members):
+            setattr(self, member, i)
+
+    def __getattr__(self, item):    # any selector not listed above still resolves
+        if item.startswith('_'):
+            raise AttributeError(item)
+        return f"{self._name}.{item}"
+
+
+kHvacMode = _Enum("kHvacMode", "Off", "Heat", "Cool", "HeatCool", "ProgramHeat", "ProgramCool", "ProgramHeatCool")
+kFanMode = _Enum("kFanMode", "Auto", "AlwaysOn")
+kStateImageSel = _Enum("kStateImageSel", "Auto")
+kProtocol = _Enum("kProtocol", "Plugin")
+kThermostatAction = _Enum("kThermostatAction")
+kUniversalAction = _Enum("kUniversalAction")
+
+Dict = dict
+List = list
+
+
+class Device:
+
+    def __init__(self, dev_id, deviceTypeId, name, address="", props=None, pluginId="com.flyingdiver.indigoplugin.ecobee"):
+        self.id = dev_id
+        self.deviceTypeId = deviceTypeId
+        self.name = name
+        self.address = address
+        self.pluginId = pluginId
+        self.pluginProps = dict(props or {})
+        self.states = {}
+        self.folderId = 0
+        self.model = ""
+        self.subModel = ""
+        self.heatSetpoint = 68.0
+        self.coolSetpoint = 76.0
+        self.errorState = None
+
+    def updateStateOnServer(self, key, value, uiValue=None, decimalPlaces=None):
+        counters.state_calls += 1
+        counters.state_writes += 1
+        counters.count(self, 1)
+        self.states[key] = value
+
+    def updateStatesOnServer(self, update_list):
+        counters.state_calls += 1
+        counters.state_writes += len(update_list)
+        counters.count(self, len(update_list))
+        for update in update_list:
+            self.states[update['key']] = update['value']
+
+    def updateStateImageOnServer(self, image):
+        counters.image_writes += 1
+        counters.count(self, 1)
+
+    def setErrorStateOnServer(self, error):
+        counters.state_calls += 1
+        self.errorState = error
+
+    def replacePluginPropsOnServer(self, props):
+        counters.props_writes += 1
+        counters.count(self, 1)
+        self.pluginProps = dict(props)
+        self.address = self.pluginProps.get("address", self.address)
+
+    def replaceOnServer(self):
+        counters.props_writes += 1
+        counters.count(self, 1)
+
+    def stateListOrDisplayStateIdChanged(self):
+        pass
+
+
+class DeviceList(dict):
+
+    def __getitem__(self, key):
+        return dict.__getitem__(self, int(key))
+
+    def iter(self, filter=""):
+        return iter(list(self.values()))
+
+
+devices = DeviceList()
+_next_id = [1000]
+
+
+def add_device(deviceTypeId, name, address="", props=None):
+    _next_id[0] += 1
+    dev = Device(_next_id[0], deviceTypeId, name, address, props)
+    devices[dev.id] = dev
+    return dev
+
+
+class _DeviceCommands:
+
+    @staticmethod
+    def create(protocol, address="", name="", description="", deviceTypeId="", folder=0, props=None, **kwargs):
+        dev = add_device(deviceTypeId, name or f"{deviceTypeId} {_next_id[0] + 1}", address, props)
+        dev.folderId = folder
+        return dev
+
+
+device = _DeviceCommands()
+
+
+class _Variables:
+
+    def __init__(self):
+        self.values = {}
+
+    def updateValue(self, var_id, value):
+        self.values[var_id] = value
+
+
+variable = _Variables()
+
+
+class _Server:
+
+    def __init__(self):
+        self.folder = tempfile.mkdtemp(prefix="ecobee-bench-")
+
+    def getInstallFolderPath(self):
+        return self.folder
+
+    @staticmethod
+    def broadcastToSubscribers(message, payload=None):
+        counters.broadcasts += 1
+
+    @staticmethod
+    def log(msg, **kwargs):
+        logging.getLogger("Plugin").info(msg)
+
+
+server = _Server()
+
+
+def rawServerRequest(command, params):
+    return {}
+
+
+def rawServerCommand(command, params):
+    pass
+
+
+class PluginBase:
+
+    class StopThread(Exception):
+        pass
+
+    def __init__(self, pluginId, pluginDisplayName, pluginVersion, pluginPrefs):
+        self.pluginId = pluginId
+        self.pluginDisplayName = pluginDisplayName
+        self.pluginVersion = pluginVersion
+        self.pluginPrefs = pluginPrefs
+        self.logger = logging.getLogger("Plugin")
+        self.indigo_log_handler = logging.NullHandler()
+        self.plugin_file_handler = logging.NullHandler()
+        self.sleep_hook = None
+
+    def sleep(self, seconds):
+        if self.sleep_hook:
+            self.sleep_hook(seconds)
+        else:
+            time.sleep(seconds)
+
+    def savePluginPrefs(self):
+        counters.props_writes += 1
+
+    def getDeviceStateList(self, dev):
+        return []
+
+    def deviceUpdated(self, origDev, newDev):
+        pass
+
+    def browserOpen(self, url):
+        pass
+
+
+activePlugin = None
+
+
+def install():
+    """Register this module as 'indigo', both importable and as the builtin Indigo injects into plugin.py."""
+    logging.addLevelName(THREADDEBUG, "THREADDEBUG")
+    if not hasattr(logging.Logger, "threaddebug"):
+        logging.Logger.threaddebug = lambda self, msg, *args, **kwargs: self.log(THREADDEBUG, msg, *args, **kwargs)
+    module = sys.modules[__name__]
+    sys.modules['indigo'] = module
+    builtins.indigo = module
+    return module
+
+
+def reset():
+    devices.clear()
+    counters.reset()
+    variable.values.clear()
+
@@ -0,0 +1,94 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#
+# Synthetic load for the mock Ecobee server.  Builds realistic thermostatList responses for any number of accounts,
+# thermostats per account and remote sensors per thermostat, with a mix of models, and changes a random fraction of
+# the thermostats between cycles.
+#
+
+import random
+
+import payloads
+
+DEFAULT_MODEL_MIX = {'athenaSmart': 3, 'nikeSmart': 2, 'apolloSmart': 2, 'aresSmart': 1, 'idtSmart': 1, 'siSmart': 1, 'corSmart': 1}
+
+EQUIPMENT = ["", "fan", "heatPump,fan", "compCool1,fan", "auxHeat1,fan"]
+HVAC_MODES = ["auto", "heat", "cool", "off"]
+
+
+def parse_model_mix(text):
+    """'athenaSmart:3,nikeSmart:2,idtSmart' -> {'athenaSmart': 3, 'nikeSmart': 2, 'idtSmart': 1}"""
+    mix = {}
+    for item in text.split(","):
+        model, _, weight = item.strip().partition(":")
+        mix[model] = float(weight or 1)
+    return mix
+
+
+class LoadGenerator:
+
+    def __init__(self, accounts=1, thermostats=10, remotes=4, model_mix=None, change_rate=(0.1, 0.5), seed=1):
+        self.random = random.Random(seed)
+        self.change_rate = change_rate if isinstance(change_rate, tuple) else (change_rate, change_rate)
+        self.cycle = 0
+        self.names = [f"L{i:03d}" for i in range(accounts)]
+
+        mix = model_mix or DEFAULT_MODEL_MIX
+        models, weights = list(mix.keys()), list(mix.values())
+
+        self.thermostats = {}
+        for name in self.names:
+            self.thermostats[name] = [
+                payloads.thermostat(f"{name}{i:05d}", f"{name} Stat {i}", self.random.choices(models, weights)[0],
+                                    remotes,
+                                    temperature=self.random.randint(640, 780), humidity=self.random.randint(25, 60))
+                for i in range(thermostats)
+            ]
+
+    def source(self, name):
+        """Payload source for MockEcobee.add_account()."""
+        return lambda: self.thermostats[name]
+
+    def attach(self, mock):
+        for name in self.names:
+            mock.add_account(name, self.source(name))
+        return self.names
+
+    @property
+    def total_thermostats(self):
+        return sum(len(stats) for stats in self.thermostats.values())
+
+    # Change a random fraction of the thermostats, with the fraction itself drawn from the change rate range.
+
+    def advance(self):
+        self.cycle += 1
+        changed = 0
+        for stats in self.thermostats.values():
+            rate = self.random.uniform(*self.change_rate)
+            for therm in self.random.sample(stats, int(round(len(stats) * rate))):
+                self.mutate(therm)
+                changed += 1
+        return changed
+
+    def mutate(self, therm):
+        rnd = self.random
+        runtime = therm["runtime"]
+        runtime["actualTemperature"] = max(500, min(900, runtime["actualTemperature"] + rnd.randint(-10, 10)))
+        runtime["actualHumidity"] = max(10, min(90, runtime["actualHumidity"] + rnd.randint(-2, 2)))
+        therm["equipmentStatus"] = rnd.choice(EQUIPMENT)
+
+        if rnd.random() < 0.1:
+            runtime["desiredHeat"] = rnd.randint(620, 720)
+            runtime["desiredCool"] = runtime["desiredHeat"] + rnd.randint(30, 80)
+        if rnd.random() < 0.05:
+            therm["settings"]["hvacMode"] = rnd.choice(HVAC_MODES)
+        if rnd.random() < 0.1:
+            therm["program"]["currentClimateRef"] = rnd.choice(payloads.CLIMATES)[0]
+
+        for sensor in therm["remoteSensors"]:
+            for cap in sensor["capability"]:
+                if cap["type"] == "temperature":
+                    cap["value"] = str(max(500, min(900, int(cap["value"]) + rnd.randint(-10, 10))))
+                elif cap["type"] == "occupancy" and rnd.random() < 0.2:
+                    cap["value"] = "false" if cap["value"] == "true" else "true"
@@ -0,0 +1,154 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#
+# Local stand-in for api.ecobee.com.  Serves /authorize, /token, /1/thermostat and /1/thermostatSummary from
+# in-memory payloads, one payload source per account.  Accounts are told apart by their tokens: the refresh token
+# "refresh-<name>" is exchanged for the access token "access-<name>".
+#
+
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import payloads
+
+
+class MockStats:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.requests = 0
+        self.bytes_sent = 0
+        self.paths = {}
+
+    def count(self, path, size):
+        with self.lock:
+            self.requests += 1
+            self.bytes_sent += size
+            self.paths[path] = self.paths.get(path, 0) + 1
+
+    def as_dict(self):
+        return {'requests': self.requests, 'bytes': self.bytes_sent, 'paths': dict(self.paths)}
+
+
+class MockEcobee:
+
+    def __init__(self, latency=0.0):
+        self.accounts = {}      # account name -> callable returning the current thermostatList
+        self.latency = latency
+        self.stats = MockStats()
+        self.server = None
+        self.thread = None
+
+    def add_account(self, name, source):
+        """source is a thermostatList, or a callable returning one on every fetch."""
+        self.accounts[name] = source if callable(source) else (lambda: source)
+
+    def thermostat_list(self, name, weather=False):
+        """The account's thermostats, with the weather object only when it was asked for, like the real API."""
+        thermostats = self.accounts[name]()
+        if weather:
+            return thermostats
+        return [{key: value for key, value in therm.items() if key != "weather"} for therm in thermostats]
+
+    @staticmethod
+    def includes(query, flag):
+        try:
+            return json.loads(query.get("json", "{}")).get("selection", {}).get(flag) in (True, "true")
+        except ValueError:
+            return False
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def log_message(self, fmt, *args):     # keep benchmark output clean
+                pass
+
+            def do_GET(self):
+                mock.handle(self, "GET")
+
+            def do_POST(self):
+                mock.handle(self, "POST")
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self.url
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    # request handling
+
+    def handle(self, handler, method):
+        if self.latency:
+            time.sleep(self.latency)
+
+        parsed = urlparse(handler.path)
+        query = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+        length = int(handler.headers.get("Content-Length", 0) or 0)
+        body = handler.rfile.read(length) if length else b""
+        account = self.account_for(handler.headers.get("Authorization", ""))
+
+        if parsed.path == "/authorize":
+            status, reply = 200, {"ecobeePin": "ABCD-EFGH", "code": "mock-code", "scope": "smartWrite", "expires_in": 900, "interval": 30}
+        elif parsed.path == "/token":
+            status, reply = self.token(query)
+        elif account is None:
+            status, reply = 500, {"status": {"code": 14, "message": "Authentication token has expired."}}
+        elif parsed.path == "/1/thermostat" and method == "GET":
+            status, reply = 200, payloads.response(self.thermostat_list(account, self.includes(query, "includeWeather")))
+        elif parsed.path == "/1/thermostat" and method == "POST":
+            status, reply = 200, {"status": {"code": 0, "message": ""}}
+        elif parsed.path == "/1/thermostatSummary":
+            status, reply = 200, self.summary(account)
+        else:
+            status, reply = 404, {"status": {"code": 404, "message": f"no mock for {parsed.path}"}}
+
+        data = json.dumps(reply).encode("utf-8")
+        self.stats.count(parsed.path, len(data) + len(body))     # counted before replying, so the client never sees stale stats
+        handler.send_response(status)
+        handler.send_header("Content-Type", "application/json;charset=UTF-8")
+        handler.send_header("Content-Length", str(len(data)))
+        handler.end_headers()
+        handler.wfile.write(data)
+
+    def account_for(self, authorization):
+        token = authorization.replace("Bearer ", "")
+        if token.startswith("access-") and token[7:] in self.accounts:
+            return token[7:]
+        return None
+
+    def token(self, query):
+        if query.get("grant_type") == "ecobeePin":
+            name = next(iter(self.accounts))
+        else:
+            name = query.get("refresh_token", "").replace("refresh-", "")
+        if name not in self.accounts:
+            return 400, {"error": "invalid_grant", "error_description": "The authorization grant is invalid"}
+        return 200, {"access_token": f"access-{name}", "refresh_token": f"refresh-{name}", "token_type": "Bearer",
+                     "expires_in": 3599, "scope": "smartWrite"}
+
+    def summary(self, account):
+        revisions = []
+        for therm in self.thermostat_list(account):
+            digest = hashlib.md5(json.dumps(therm, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+            revisions.append(f"{therm['identifier']}:{therm['name']}:true:{digest}:{digest}:{digest}:{digest}")
+        return {"revisionList": revisions, "thermostatCount": len(revisions), "status": {"code": 0, "message": ""}}
@@ -0,0 +1,115 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#
+# Synthetic and recorded /1/thermostat payloads for the mock Ecobee server.
+#
+
+import gzip
+import json
+
+CLIMATES = [("home", "Home"), ("away", "Away"), ("sleep", "Sleep")]
+
+# one week program, 48 half hour slots per day, Monday first
+DAY_SCHEDULE = ["sleep"] * 12 + ["home"] * 4 + ["away"] * 20 + ["home"] * 10 + ["sleep"] * 2
+SCHEDULE = [list(DAY_SCHEDULE) for _ in range(7)]
+
+REMOTE_MODELS = ['athenaSmart', 'nikeSmart', 'apolloSmart', 'vulcanSmart', 'aresSmart', 'artemisSmart']
+
+
+def capability(cap_type, value, cap_id):
+    return {"id": str(cap_id), "type": cap_type, "value": str(value)}
+
+
+def remote_sensor(code, name, temperature=715, occupied=False):
+    return {
+        "id": f"rs:{code}",
+        "name": name,
+        "type": "ecobee3_remote_sensor",
+        "code": code,
+        "inUse": False,
+        "capability": [capability("temperature", temperature, 1), capability("occupancy", "true" if occupied else "false", 2)],
+    }
+
+
+def internal_sensor(name, temperature=720, humidity=40, occupied=True):
+    return {
+        "id": "ei:0",
+        "name": name,
+        "type": "thermostat",
+        "inUse": True,
+        "capability": [capability("temperature", temperature, 1), capability("humidity", humidity, 2),
+                       capability("occupancy", "true" if occupied else "false", 3)],
+    }
+
+
+def weather(temperature=545, high=610, low=420):
+    return {
+        "timestamp": "2026-10-19 15:45:00",
+        "weatherStation": "ML:123456",
+        "forecasts": [{
+            "weatherSymbol": 2, "dateTime": "2026-10-19 12:00:00", "condition": "Partly cloudy", "temperature": temperature,
+            "pressure": 1016, "relativeHumidity": 62, "dewpoint": 420, "visibility": 16093, "windSpeed": 8, "windGust": -5002,
+            "windDirection": "NW", "windBearing": 315, "pop": 10, "tempHigh": high, "tempLow": low, "sky": 5,
+        }],
+    }
+
+
+def thermostat(identifier, name, model="athenaSmart", remotes=2, temperature=720, humidity=40, heat=680, cool=760,
+               hvac_mode="auto", climate="home", equipment="", occupied=True):
+    sensors = [internal_sensor(name, temperature, humidity, occupied)]
+    if model in REMOTE_MODELS:
+        sensors.extend(remote_sensor(f"R{identifier}{i:02d}", f"{name} Room {i}", temperature - 5 + i, i % 2 == 0)
+                       for i in range(remotes))
+    return {
+        "identifier": identifier,
+        "name": name,
+        "brand": "ecobee",
+        "features": "Home,HomeKit",
+        "modelNumber": model,
+        "thermostatTime": "2026-10-19 12:00:00",
+        "utcTime": "2026-10-19 16:00:00",
+        "equipmentStatus": equipment,
+        "program": {
+            "schedule": SCHEDULE,
+            "climates": [{"climateRef": ref, "name": label} for ref, label in CLIMATES],
+            "currentClimateRef": climate,
+        },
+        "settings": {"hvacMode": hvac_mode, "fanMinOnTime": 0},
+        "runtime": {
+            "connected": True,
+            "desiredCool": cool,
+            "desiredHeat": heat,
+            "actualTemperature": temperature,
+            "actualHumidity": humidity,
+            "desiredFanMode": "auto",
+        },
+        "events": [],
+        "remoteSensors": sensors,
+        "weather": weather(),
+    }
+
+
+def account(prefix, thermostats=5, remotes=4, model="athenaSmart"):
+    return [thermostat(f"{prefix}{i:04d}", f"Stat {prefix}{i}", model, remotes) for i in range(thermostats)]
+
+
+def response(thermostat_list):
+    return {
+        "page": {"page": 1, "totalPages": 1, "pageSize": len(thermostat_list), "total": len(thermostat_list)},
+        "thermostatList": thermostat_list,
+        "status": {"code": 0, "message": ""},
+    }
+
+
+def load_recorded(path):
+    """A recorded /1/thermostat response body, just its thermostatList, or the last thermostat fetch in an API cassette."""
+    if path.endswith(".gz"):
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            fetches = [entry for entry in map(json.loads, filter(str.strip, f))
+                       if entry["method"] == "GET" and entry["path"] == "/1/thermostat" and "response" in entry]
+        return fetches[-1]["response"]["thermostatList"]
+
+    with open(path) as f:
+        data = json.load(f)
+    return data["thermostatList"] if isinstance(data, dict) else data
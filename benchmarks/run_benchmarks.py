@@ -0,0 +1,215 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#
+# Offline benchmarks for the Ecobee 2 plugin.  Runs the plugin against the local mock Ecobee server with a stub
+# 'indigo' module and reports requests, bytes, wall time and Indigo writes per poll cycle.  unchanged_poll is a
+# scheduled poll with nothing changed on the server, which change detection answers from the thermostat summary.
+# Change detection is off by default in the plugin, the benchmarks turn it on.
+#
+#   python3 benchmarks/run_benchmarks.py
+#   python3 benchmarks/run_benchmarks.py --accounts 2 --thermostats 10 --remotes 4 --iterations 20
+#   python3 benchmarks/run_benchmarks.py --payload recorded_thermostat_response.json
+#   python3 benchmarks/run_benchmarks.py --check benchmarks/thresholds.json
+#
+
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PLUGIN_DIR = os.path.join(os.path.dirname(BENCH_DIR), "Ecobee 2.indigoPlugin", "Contents", "Server Plugin")
+PLUGIN_ID = "com.flyingdiver.indigoplugin.ecobee"
+
+sys.path.insert(0, BENCH_DIR)
+
+import indigo_stub      # noqa: E402
+import payloads         # noqa: E402
+from mock_ecobee import MockEcobee     # noqa: E402
+
+
+def load_plugin():
+    """Import the plugin modules with the stub indigo module installed.  Returns (plugin module, ecobee_account module)."""
+    indigo_stub.install()
+    if PLUGIN_DIR not in sys.path:
+        sys.path.insert(0, PLUGIN_DIR)
+    import plugin           # noqa
+    import ecobee_account   # noqa
+    return plugin, ecobee_account
+
+
+class Bench:
+    """A plugin instance, with account, thermostat and sensor devices, running against a mock server."""
+
+    def __init__(self, mock, account_names, prefs=None):
+        self.mock = mock
+        self.plugin_module, self.account_module = load_plugin()
+        self.account_module.API_URL = mock.url
+        indigo_stub.reset()
+
+        plugin_prefs = {"updateFrequency": "15", "temperatureScale": "F", "logLevel": "30"}
+        plugin_prefs.update(prefs or {})
+        account_devs = []
+        for name in account_names:
+            dev = indigo_stub.add_device("EcobeeAccount", f"Ecobee Account {name}")
+            plugin_prefs[f"refreshToken-{dev.id}"] = f"refresh-{name}"
+            account_devs.append(dev)
+
+        self.plugin = self.plugin_module.Plugin(PLUGIN_ID, "Ecobee 2", "benchmark", plugin_prefs)
+        indigo_stub.activePlugin = self.plugin
+        logging.getLogger("Plugin").setLevel(logging.WARNING)
+
+        for dev in account_devs:
+            self.plugin.deviceStartComm(dev)
+
+        # create and start every thermostat and sensor device
+        for accountID, account in list(self.plugin.ecobee_accounts.items()):
+            account.server_update()
+            self.plugin.discover_devices(accountID, account)
+        for dev in list(indigo_stub.devices.values()):
+            if dev.deviceTypeId != "EcobeeAccount":
+                self.plugin.deviceStartComm(dev)
+
+    @property
+    def device_count(self):
+        return len(self.plugin.ecobee_thermostats) + len(self.plugin.ecobee_remotes)
+
+    def run_cycle(self):
+        """One pass through the runConcurrentThread loop, with an update due."""
+        def stop(seconds):
+            raise self.plugin.StopThread()
+
+        self.plugin.sleep_hook = stop
+        self.plugin.update_needed = True
+        self.plugin.runConcurrentThread()
+        self.plugin.sleep_hook = None
+
+
+def measure(name, func, iterations, mock, warmup=False):
+    if warmup:
+        func()
+    times = []
+    requests = bytes_sent = writes = calls = 0
+    writes_by_type = {}
+    for _ in range(iterations):
+        mock.stats.reset()
+        indigo_stub.counters.reset()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+        requests += mock.stats.requests
+        bytes_sent += mock.stats.bytes_sent
+        writes += indigo_stub.counters.state_writes + indigo_stub.counters.image_writes + indigo_stub.counters.props_writes
+        calls += indigo_stub.counters.state_calls
+        for deviceTypeId, count in indigo_stub.counters.writes_by_type.items():
+            writes_by_type[deviceTypeId] = writes_by_type.get(deviceTypeId, 0) + count
+    return {
+        "name": name,
+        "iterations": iterations,
+        "wall_ms_median": statistics.median(times) * 1000.0,
+        "wall_ms_max": max(times) * 1000.0,
+        "requests": requests / iterations,
+        "bytes": bytes_sent / iterations,
+        "indigo_writes": writes / iterations,
+        "indigo_calls": calls / iterations,
+        "writes_by_type": {deviceTypeId: count / iterations for deviceTypeId, count in writes_by_type.items()},
+    }
+
+
+def run(args):
+    mock = MockEcobee(latency=args.latency)
+    names = [chr(ord('A') + i) for i in range(args.accounts)]
+    for name in names:
+        if args.payload:
+            mock.add_account(name, payloads.load_recorded(args.payload))
+        else:
+            mock.add_account(name, payloads.account(name, args.thermostats, args.remotes, args.model))
+    mock.start()
+
+    try:
+        bench = Bench(mock, names, {"changeDetection": True})
+        plugin = bench.plugin
+        accounts = list(plugin.ecobee_accounts.values())
+
+        results = [
+            measure("server_update", lambda: [a.server_update(force=True) for a in accounts], args.iterations, mock),
+            measure("unchanged_poll", lambda: [a.server_update() for a in accounts], args.iterations, mock, warmup=True),
+            measure("thermostat_update", lambda: [t.update() for t in plugin.ecobee_thermostats.values()], args.iterations, mock),
+            measure("remote_update", lambda: [r.update() for r in plugin.ecobee_remotes.values()], args.iterations, mock),
+            measure("full_cycle", bench.run_cycle, args.iterations, mock),
+        ]
+        occupancy_sensors = sum(1 for dev in indigo_stub.devices.values() if dev.deviceTypeId == "OccupancySensor")
+        scenario = {"accounts": args.accounts, "thermostats": len(plugin.ecobee_thermostats), "remotes": len(plugin.ecobee_remotes),
+                    "occupancy_sensors": occupancy_sensors,
+                    "payload": args.payload or "synthetic", "latency": args.latency}
+        return scenario, results
+    finally:
+        mock.stop()
+
+
+def report(scenario, results):
+    print(f"Scenario: {scenario}")
+    print(f"{'benchmark':<20}{'median ms':>12}{'max ms':>10}{'requests':>10}{'bytes':>12}{'writes':>10}{'calls':>8}")
+    for r in results:
+        print(f"{r['name']:<20}{r['wall_ms_median']:>12.2f}{r['wall_ms_max']:>10.2f}{r['requests']:>10.1f}{r['bytes']:>12.0f}"
+              f"{r['indigo_writes']:>10.1f}{r['indigo_calls']:>8.1f}")
+
+
+def check(scenario, results, path):
+    """Compare against regression thresholds.  Per-cycle counts are normalized per account, and Indigo writes per
+    device of each type, so the thresholds don't depend on the mix of thermostats and remote sensors."""
+    with open(path) as f:
+        thresholds = json.load(f)
+
+    failures = []
+    for r in results:
+        limits = thresholds.get(r["name"], {})
+        writes = r["writes_by_type"]
+        measured = {
+            "wall_ms_median": r["wall_ms_median"],
+            "requests_per_account": r["requests"] / scenario["accounts"],
+            "bytes_per_account": r["bytes"] / scenario["accounts"],
+            "writes_per_account": writes.get("EcobeeAccount", 0) / scenario["accounts"],
+            "writes_per_thermostat": writes.get("EcobeeThermostat", 0) / max(scenario["thermostats"], 1),
+            "writes_per_remote": writes.get("RemoteSensor", 0) / max(scenario["remotes"], 1),
+            "writes_per_occupancy_sensor": writes.get("OccupancySensor", 0) / max(scenario["occupancy_sensors"], 1),
+        }
+        for key, limit in limits.items():
+            if key in measured and measured[key] > limit:
+                failures.append(f"{r['name']}.{key} = {measured[key]:.2f} exceeds {limit}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the Ecobee 2 plugin")
+    parser.add_argument("--accounts", type=int, default=1)
+    parser.add_argument("--thermostats", type=int, default=5, help="thermostats per account")
+    parser.add_argument("--remotes", type=int, default=4, help="remote sensors per thermostat")
+    parser.add_argument("--model", default="athenaSmart")
+    parser.add_argument("--payload", help="recorded /1/thermostat response to replay for every account")
+    parser.add_argument("--latency", type=float, default=0.0, help="simulated API latency, seconds")
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--check", help="regression thresholds file, exits non-zero if any is exceeded")
+    args = parser.parse_args()
+
+    scenario, results = run(args)
+    report(scenario, results)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"scenario": scenario, "results": results}, f, indent=2)
+
+    if args.check:
+        failures = check(scenario, results, args.check)
+        for failure in failures:
+            print(f"REGRESSION: {failure}")
+        sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#
+# Scaling curves for the plugin: parse, fan-out and memory at increasing numbers of thermostats.
+#
+#   python3 benchmarks/scale.py --sizes 10,100,500 --csv scale.csv --chart scale.png
+#   python3 benchmarks/scale.py --sizes 100 --accounts 4 --models athenaSmart:1,idtSmart:1 --change-rate 0.2
+#
+# The chart needs matplotlib; without it only the table and CSV are written.
+#
+
+import argparse
+import csv
+import statistics
+import sys
+import time
+import tracemalloc
+
+import requests
+
+from load_generator import LoadGenerator, parse_model_mix
+from mock_ecobee import MockEcobee
+from run_benchmarks import Bench
+
+
+def measure_size(total, args):
+    per_account = max(total // args.accounts, 1)
+    generator = LoadGenerator(args.accounts, per_account, args.remotes, parse_model_mix(args.models) if args.models else None,
+                              (args.change_rate, args.change_rate * 2), seed=args.seed)
+    mock = MockEcobee()
+    names = generator.attach(mock)
+    mock.start()
+
+    try:
+        # memory held by the plugin for this inventory; tracemalloc is off again for the timed cycles
+        tracemalloc.start()
+        bench = Bench(mock, names)
+        resident_bytes = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        plugin = bench.plugin
+        accounts = list(plugin.ecobee_accounts.values())
+
+        def poll():
+            for account in accounts:
+                account.server_update(force=True)
+
+        def fan_out():
+            for stat in plugin.ecobee_thermostats.values():
+                stat.update()
+            for remote in plugin.ecobee_remotes.values():
+                remote.update()
+
+        fetch, update, fanout, changed = [], [], [], []
+        for _ in range(args.cycles):
+            changed.append(generator.advance())
+
+            # HTTP alone, so it can be taken out of the server_update time
+            start = time.perf_counter()
+            for account in accounts:
+                requests.get(f"{mock.url}/1/thermostat", headers={'Authorization': 'Bearer ' + account.access_token})
+            fetch.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            poll()
+            update.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            fan_out()
+            fanout.append(time.perf_counter() - start)
+
+        # peak allocation during one more cycle
+        generator.advance()
+        tracemalloc.start()
+        poll()
+        fan_out()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        return {
+            "thermostats": generator.total_thermostats,
+            "remotes": len(plugin.ecobee_remotes),
+            "changed_per_cycle": statistics.mean(changed),
+            "fetch_ms": statistics.median(fetch) * 1000.0,
+            "parse_ms": max(statistics.median(update) - statistics.median(fetch), 0.0) * 1000.0,
+            "fanout_ms": statistics.median(fanout) * 1000.0,
+            "memory_kb": resident_bytes / 1024.0,
+            "peak_memory_kb": peak / 1024.0,
+        }
+    finally:
+        mock.stop()
+
+
+def chart(rows, path):
+    try:
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+    except ImportError:
+        print("matplotlib not installed, skipping chart")
+        return
+
+    sizes = [row["thermostats"] for row in rows]
+    fig, (times, memory) = plt.subplots(1, 2, figsize=(11, 4))
+    for key in ("fetch_ms", "parse_ms", "fanout_ms"):
+        times.plot(sizes, [row[key] for row in rows], marker="o", label=key)
+    times.set_xlabel("thermostats")
+    times.set_ylabel("ms per cycle")
+    times.legend()
+    memory.plot(sizes, [row["memory_kb"] for row in rows], marker="o", label="memory_kb")
+    memory.plot(sizes, [row["peak_memory_kb"] for row in rows], marker="o", label="peak_memory_kb (per cycle)")
+    memory.set_xlabel("thermostats")
+    memory.set_ylabel("KiB")
+    memory.legend()
+    fig.tight_layout()
+    fig.savefig(path)
+    print(f"chart written to {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scaling curves for the Ecobee 2 plugin")
+    parser.add_argument("--sizes", default="10,100,500", help="total thermostats for each run")
+    parser.add_argument("--accounts", type=int, default=1)
+    parser.add_argument("--remotes", type=int, default=4, help="remote sensors per thermostat, on models that support them")
+    parser.add_argument("--models", help="model mix, e.g. athenaSmart:3,nikeSmart:2,idtSmart:1")
+    parser.add_argument("--change-rate", type=float, default=0.2, help="minimum fraction of thermostats changed per cycle")
+    parser.add_argument("--cycles", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--csv", help="write the results to this CSV file")
+    parser.add_argument("--chart", help="write a PNG chart of the scaling curves")
+    args = parser.parse_args()
+
+    # a small run first, so the plugin's module imports and other first-use allocations aren't counted in the memory
+    # of the first size
+    measure_size(args.accounts, args)
+
+    rows = []
+    for size in [int(s) for s in args.sizes.split(",")]:
+        rows.append(measure_size(size, args))
+        row = rows[-1]
+        print(f"{row['thermostats']:>6} thermostats {row['remotes']:>6} remotes  fetch {row['fetch_ms']:8.1f} ms  "
+              f"parse {row['parse_ms']:8.1f} ms  fan-out {row['fanout_ms']:8.1f} ms  memory {row['memory_kb']:9.0f} KiB  "
+              f"peak {row['peak_memory_kb']:9.0f} KiB", flush=True)
+
+    if args.csv:
+        with open(args.csv, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+            writer.writeheader()
+            writer.writerows(rows)
+
+    if args.chart:
+        chart(rows, args.chart)
+
+
+if __name__ == "__main__":
+    sys.exit(main())